@@ -0,0 +1,22 @@
+# times compiling a grammar against loading it from the on-disk cache,
+# the cache is a fresh temporary directory, so the first run misses.
+#
+#     python -m benchmarks.compile_cache [rules]
+import sys, tempfile, time
+from grammarboy import Grammar
+from grammarboy.cache import CompileCache
+from .pair_dispatch import random_grammar
+
+def main(size=2000, runs=3):
+    base = random_grammar(size)
+    with tempfile.TemporaryDirectory() as directory:
+        cache = CompileCache(directory)
+        print("{} rules".format(len(base.rules)))
+        for run in range(runs):
+            grammar = Grammar(base.rules, base.terminals, cache)
+            start = time.perf_counter()
+            grammar.cnf
+            print("run {}: {:.3f}s, {}".format(run, time.perf_counter() - start, cache))
+
+if __name__=='__main__':
+    main(*map(int, sys.argv[1:]))
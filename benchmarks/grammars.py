@@ -0,0 +1,71 @@
+# grammars to benchmark with, each generator returns (grammar, start).
+import random, string
+from grammarboy import Grammar, keyword, near
+
+# operator words, "oab" is the second operator of the first level.
+def opname(level, op):
+    return "o" + string.ascii_lowercase[level] + string.ascii_lowercase[op]
+
+# a precedence ladder like the one in demo.py,
+# e0 <- e0 op e1 | e1 on every level, then parentheses and numbers.
+def ladder(levels=4, ops=2):
+    grammar = Grammar()
+    grammar.terminal("num")
+    for level in range(levels):
+        var, down = "e{}".format(level), "e{}".format(level+1)
+        grammar.rule(var, down)
+        for op in range(ops):
+            grammar.rule(var, var, keyword(opname(level, op)), down)
+    atom = "e{}".format(levels)
+    grammar.rule(atom, "num")
+    grammar.rule(atom, keyword("("), "e0", keyword(")"))
+    return grammar, "e0"
+
+# every split of a sum is a parse, the number of parses grows
+# like the catalan numbers.
+def ambiguous(ops=1):
+    grammar = Grammar()
+    grammar.terminal("num")
+    grammar.rule("s", "num")
+    grammar.rule("s", "s", "s")
+    for op in range(ops):
+        grammar.rule("s", "s", keyword(opname(0, op)), "s")
+    return grammar, "s"
+
+# statements introduced by one of many keywords.
+def keywords(count=200):
+    grammar = Grammar()
+    grammar.terminal("num")
+    grammar.terminal("sym")
+    grammar.rule("stmts", "stmt")
+    grammar.rule("stmts", "stmts", "stmt")
+    grammar.rule("arg", "num")
+    grammar.rule("arg", "sym")
+    grammar.rule("arg", near("num"))
+    for i in range(count):
+        word = "k" + "".join(string.ascii_lowercase[int(d)] for d in str(i))
+        grammar.rule("stmt", keyword(word), "arg")
+    return grammar, "stmts"
+
+# long rules that binarize into many Implicit suffixes,
+# some of them shared between rules.
+def implicit(rules=40, width=6, seed=0):
+    rng = random.Random(seed)
+    grammar = Grammar()
+    grammar.terminal("num")
+    grammar.terminal("sym")
+    parts = ["num", "sym"] + [keyword(opname(0, op)) for op in range(4)]
+    tails = [[rng.choice(parts) for _ in range(width // 2)] for _ in range(4)]
+    grammar.rule("top", "item")
+    grammar.rule("top", "top", "item")
+    for i in range(rules):
+        head = [rng.choice(parts) for _ in range(width - width // 2)]
+        grammar.rule("item", *head + rng.choice(tails))
+    return grammar, "top"
+
+generators = {
+    "ladder":    ladder,
+    "ambiguous": ambiguous,
+    "keywords":  keywords,
+    "implicit":  implicit,
+}
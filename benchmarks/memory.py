@@ -0,0 +1,37 @@
+# measures the memory that the tokens, the table and the results of a
+# parse hold on to, with the tokens kept as Token objects and in a
+# TokenBuffer.
+#
+#     python -m benchmarks.memory [lines] [tokens to parse]
+import random, sys, tracemalloc
+from grammarboy import TokenBuffer, tokenize
+from . import grammars, sentences
+
+# the bytes still allocated after fn, and its output.
+def held(fn, *args):
+    tracemalloc.start()
+    try:
+        out = fn(*args)
+        return tracemalloc.get_traced_memory()[0], out
+    finally:
+        tracemalloc.stop()
+
+def main(lines=2500, length=120):
+    grammar, start = grammars.ladder()
+    grammar.cnf
+    text = "\n".join(sentences.render(sentences.sentence(grammar, start, 40, random.Random(i)))
+        for i in range(lines))
+    keywords = grammar.keywords()
+    size, tokens = held(lambda: list(tokenize(text, keywords)))
+    print("{} tokens as Token objects: {:.1f}KB".format(len(tokens), size / 1024))
+    size, buffer = held(lambda: TokenBuffer(tokenize(text, keywords)))
+    print("{} tokens in a TokenBuffer: {:.1f}KB".format(len(buffer), size / 1024))
+
+    tokens = sentences.sentence(grammar, start, length, random.Random(5))
+    size, table = held(grammar.parse, tokens)
+    print("table of {} tokens: {:.1f}KB".format(len(tokens), size / 1024))
+    size, results = held(lambda: list(table.results(limit=20000)))
+    print("{} results: {:.1f}KB".format(len(results), size / 1024))
+
+if __name__=='__main__':
+    main(*map(int, sys.argv[1:]))
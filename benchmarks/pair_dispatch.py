@@ -0,0 +1,77 @@
+# compares the indexed pair dispatch in cyk.cyk against the old loop
+# that tried every pair at every split point.
+#
+#     python -m benchmarks.pair_dispatch
+import random, time
+from grammarboy import Grammar, Token, cyk
+
+TYPES = ["t{}".format(i) for i in range(20)]
+
+# every rule introduces its own nonterminal, so the grammar grows
+# without making the cells any denser.
+def random_grammar(size, seed=0):
+    rng = random.Random(seed)
+    grammar = Grammar()
+    symbols = list(TYPES)
+    for sym in TYPES:
+        grammar.terminal(sym)
+    for i in range(size):
+        name = "n{}".format(i)
+        grammar.rule(name, rng.choice(symbols), rng.choice(TYPES))
+        symbols.append(name)
+    return grammar
+
+def naive_cyk(tokens, cnf):
+    tab, apl = cyk.chart(tokens)
+    def increment(cell, key, count=1):
+        cell[key] = cell.get(key, 0) + count
+    def store(length, i, cell, acell):
+        if cell:
+            tab.cells[tab.index(length, i)] = cell
+            apl.cells[apl.index(length, i)] = tuple(acell)
+    for i, token in enumerate(tokens):
+        cell  = {}
+        acell = []
+        increment(cell, cnf.intern(token.type))
+        for init in cnf.inits:
+            if init.match(token):
+                increment(cell, init.var)
+                acell.append((init, 1))
+                for lead in cnf.leads[init.var]:
+                    increment(cell, lead.var)
+                    acell.append((lead, 1))
+        store(1, i, cell, acell)
+    for length in range(2, len(tab)):
+        for i in range(len(tokens) - length + 1):
+            cell  = {}
+            acell = []
+            for k in range(1, length):
+                lcell = tab.lhs_cell(length, i, k)
+                rcell = tab.rhs_cell(length, i, k)
+                for pair in cnf.pairs:
+                    if pair.lhs in lcell and pair.rhs in rcell:
+                        increment(cell, pair.var, lcell[pair.lhs]*rcell[pair.rhs])
+                        acell.append((pair, k))
+                        for lead in cnf.leads[pair.var]:
+                            increment(cell, lead.var)
+                            acell.append((lead, k))
+            store(length, i, cell, acell)
+    return tab, apl, cyk.build_mintab(tab, cnf)
+
+def timeit(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+def main(sizes=(10, 50, 100, 200, 400, 800), length=40):
+    rng = random.Random(1)
+    tokens = [Token(1000+2*i, 1, rng.choice(TYPES), i, False) for i in range(length)]
+    print("{:>6} {:>10} {:>10} {:>8}".format("rules", "naive", "indexed", "speedup"))
+    for size in sizes:
+        cnf = random_grammar(size).cnf
+        naive   = timeit(naive_cyk, tokens, cnf)
+        indexed = timeit(cyk.cyk, tokens, cnf)
+        print("{:>6} {:>9.3f}s {:>9.3f}s {:>7.1f}x".format(size, naive, indexed, naive / indexed))
+
+if __name__=='__main__':
+    main()
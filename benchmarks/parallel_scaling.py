@@ -0,0 +1,39 @@
+# times the wavefront-parallel fill against the serial one
+# for 1..N workers on a long input.
+#
+#     python -m benchmarks.parallel_scaling [tokens] [workers]
+import os, sys, time
+from grammarboy import Grammar, keyword, tokenize
+
+def expression_grammar():
+    grammar = Grammar()
+    grammar.terminal("num")
+    grammar.rule("expr",   "expr90")
+    grammar.rule("expr90", "term")
+    grammar.rule("term",   "num")
+    grammar.rule("expr90", "expr90", keyword("+"), "term")
+    grammar.rule("expr90", "expr90", keyword("-"), "term")
+    grammar.rule("expr",   "expr90", keyword("and"), "expr")
+    grammar.rule("expr",   "expr90", keyword("or"),  "expr")
+    return grammar
+
+def main(length=400, workers=None):
+    workers = workers or os.cpu_count() or 1
+    grammar = expression_grammar()
+    ops = ["+", "-", "and", "or"]
+    text = " ".join("{} {}".format(i, ops[i % 4]) for i in range(length // 2)) + " 0"
+    tokens = list(tokenize(text, {"and", "or"}))
+    grammar.cnf
+    start = time.perf_counter()
+    grammar.parse(tokens)
+    serial = time.perf_counter() - start
+    print("{} tokens, serial {:.3f}s".format(len(tokens), serial))
+    print("{:>8} {:>10} {:>8}".format("workers", "time", "speedup"))
+    for count in range(1, workers+1):
+        start = time.perf_counter()
+        grammar.parse(tokens, workers=count)
+        took = time.perf_counter() - start
+        print("{:>8} {:>9.3f}s {:>7.2f}x".format(count, took, serial / took))
+
+if __name__=='__main__':
+    main(*map(int, sys.argv[1:]))
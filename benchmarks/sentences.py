@@ -0,0 +1,82 @@
+# derives inputs from a grammar.
+# The derivation grows a sentential form with rules that lengthen it
+# while it stays within the length asked for, then closes every
+# nonterminal left with its shortest expansion.
+import random
+from grammarboy import Token, far, near, rules_by_nonterminal, shortest_sequences, cyk
+
+def sentence(grammar, start, length, rng=None):
+    rng = rng or random.Random(0)
+    lengths, sequences = shortest_sequences(grammar)
+    groups = rules_by_nonterminal(grammar)
+    price  = lambda rule: sum(lengths[cell] for cell in rule)
+    form   = [start]
+    total  = lengths[start]
+    while total < length:
+        grow = []
+        for index, sym in enumerate(form):
+            for rule in groups.get(sym, ()):
+                delta = price(rule) - lengths[sym]
+                if 0 < delta <= length - total:
+                    grow.append((index, rule, delta))
+        if not grow:
+            break
+        index, rule, delta = rng.choice(grow)
+        form[index:index+1] = rule
+        total += delta
+    symbols = []
+    for sym in form:
+        if sym in groups:
+            symbols.extend(min((sequences[rule] for rule in groups[sym]), key=len))
+        else:
+            symbols.append(sym)
+    return [token(sym, i, rng) for i, sym in enumerate(symbols)]
+
+# a token that the terminal or specifier matches,
+# a specifier tells what it needs through its index().
+def token(sym, i, rng):
+    wanted = False
+    while isinstance(sym, (near, far)):
+        inner  = sym.sym
+        # near() and far() of a specifier both want a far token.
+        wanted = isinstance(sym, near) and not isinstance(inner, cyk.Specifier)
+        sym = inner
+    if isinstance(sym, cyk.Specifier):
+        key = sym.index()
+        if key is None:
+            raise ValueError("can not make a token for {!r}".format(sym))
+        field, value = key
+        if field == "type":
+            sym = value
+        else:
+            kind = "keyword" if str(value).isalpha() else "unk"
+            return Token(1000 + 2*i, len(str(value)), kind, value, wanted)
+    val = rng.randrange(100) if sym == "num" else sym
+    return Token(1000 + 2*i, len(str(val)), sym, val, wanted)
+
+# an input with some tokens dropped, doubled or replaced.
+def broken(tokens, edits=1, rng=None):
+    rng = rng or random.Random(0)
+    tokens = list(tokens)
+    for _ in range(edits):
+        if not tokens:
+            break
+        i  = rng.randrange(len(tokens))
+        op = rng.randrange(3)
+        if op == 0:
+            del tokens[i]
+        elif op == 1:
+            tokens.insert(i, tokens[i])
+        else:
+            tokens[i] = tokens[rng.randrange(len(tokens))]
+    return [Token(1000 + 2*i, t.length, t.type, t.val, t.near) for i, t in enumerate(tokens)]
+
+# the text of the tokens, tokenize() gives them back unless
+# near tokens run together.
+def render(tokens):
+    text = ""
+    for tok in tokens:
+        if text and not tok.near:
+            text += " "
+        text += str(tok.val)
+    return text
@@ -0,0 +1,83 @@
+# load test of service.serve(): clients type sentences a token at a
+# time, every keystroke sends the line so far, and the latency of the
+# answer to the last keystroke is measured. The earlier keystrokes of a
+# client are superseded by the later ones whenever the server is behind.
+#
+#     python -m benchmarks.service_load --clients 20 --length 40
+#     python -m benchmarks.service_load --port 8765   # against demo.py --serve
+import argparse, asyncio, json, random, sys, time
+from grammarboy import service
+from . import grammars, sentences
+
+async def client(host, port, texts, deadline):
+    reader, writer = await asyncio.open_connection(host, port)
+    latencies = []
+    counts = {}
+    try:
+        for number, text in enumerate(texts):
+            words = text.split(" ")
+            for stop in range(1, len(words)+1):
+                request = {"session": number, "id": stop, "text": " ".join(words[:stop])}
+                if deadline is not None:
+                    request["deadline"] = deadline
+                writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+            sent = time.perf_counter()
+            while True:
+                reply = json.loads(await reader.readline())
+                counts[reply["status"]] = counts.get(reply["status"], 0) + 1
+                if reply["session"] == number and reply["id"] == len(words):
+                    latencies.append(time.perf_counter() - sent)
+                    break
+    finally:
+        writer.close()
+    return latencies, counts
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values)-1, int(p * len(values)))]
+
+async def run(args):
+    server = None
+    port = args.port
+    if port is None:
+        grammar, start = grammars.ladder()
+        server = await service.serve(grammar, goals={start})
+        port = server.sockets[0].getsockname()[1]
+    rng = random.Random(args.seed)
+    grammar, start = grammars.ladder()
+    jobs = []
+    for _ in range(args.clients):
+        texts = [sentences.render(sentences.sentence(grammar, start, args.length, rng))
+            for _ in range(args.sentences)]
+        jobs.append(client(args.host, port, texts, args.deadline))
+    began = time.perf_counter()
+    outcomes = await asyncio.gather(*jobs)
+    took = time.perf_counter() - began
+    if server is not None:
+        server.close()
+        await server.wait_closed()
+    latencies = [latency for latency, _ in outcomes for latency in latency]
+    counts = {}
+    for _, count in outcomes:
+        for status, n in count.items():
+            counts[status] = counts.get(status, 0) + n
+    print("{} clients, {} sentences of {} tokens in {:.2f}s".format(
+        args.clients, args.clients * args.sentences, args.length, took))
+    print("latency p50={:.4f}s p95={:.4f}s max={:.4f}s".format(
+        percentile(latencies, 0.5), percentile(latencies, 0.95), max(latencies)))
+    print(" ".join("{}={}".format(status, n) for status, n in sorted(counts.items())))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="grammarboy service load test")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="an already running server, otherwise one is started")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--sentences", type=int, default=3)
+    parser.add_argument("--length", type=int, default=30)
+    parser.add_argument("--deadline", type=float, help="seconds each parse may take")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(parser.parse_args(argv)))
+
+if __name__=='__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,123 @@
+# times every phase of a parse on the generated grammars and inputs,
+# and writes the timings to a json file that later runs compare against.
+#
+#     python -m benchmarks.suite --lengths 20,40,80 --out before.json
+#     python -m benchmarks.suite --lengths 20,40,80 --compare before.json
+import argparse, json, platform, random, sys, time, tracemalloc
+import grammarboy
+from grammarboy import cyk, tokenize
+from . import grammars, sentences
+
+# the least time of repeat runs of fn, and its last output.
+def timed(repeat, fn, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out   = fn(*args)
+        took  = time.perf_counter() - start
+        best  = took if best is None else min(best, took)
+    return best, out
+
+def fill(tokens, cnf):
+    tab, apl = cyk.chart(tokens)
+    for length in range(1, len(tab)):
+        for i in range(len(tokens) - length + 1):
+            cyk.fill(tab, apl, cnf, length, i)
+    return tab, apl
+
+def peak_memory(tokens, cnf):
+    tracemalloc.start()
+    try:
+        fill(tokens, cnf)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def enumerate_results(table, limit):
+    return sum(1 for _ in table.results(limit=limit))
+
+def traverse_results(table, start):
+    outputs = []
+    for result in table.just(1):
+        if result[0] == start:
+            outputs.append(grammarboy.traverse(table, result.trees, None, ()))
+    return outputs
+
+def measure(name, grammar, start, tokens, repeat=3, limit=1000):
+    phases = {}
+    phases["cnf"], cnf = timed(repeat, cyk.cnf, grammar.rules, grammar.terminals)
+    text = sentences.render(tokens)
+    keywords = grammar.keywords()
+    phases["tokenize"], _ = timed(repeat, lambda: list(tokenize(text, keywords)))
+    phases["cyk"], (tab, apl) = timed(repeat, fill, tokens, cnf)
+    phases["mintab"], mintab = timed(repeat, cyk.build_mintab, tab, cnf)
+    phases["count"], count = timed(repeat, cyk.count, tab, cnf)
+    table = grammarboy.Table(grammar, tab, apl, mintab, cnf)
+    phases["enumerate"], results = timed(repeat, enumerate_results, table, limit)
+    phases["traverse"], _ = timed(repeat, traverse_results, table, start)
+    return {
+        "name":      name,
+        "tokens":    len(tokens),
+        "shortest":  table.shortest,
+        "count":     count,
+        "results":   results,
+        "phases":    phases,
+        "peak_bytes": peak_memory(tokens, cnf),
+    }
+
+def run(names, lengths, repeat=3, limit=1000, seed=0):
+    cases = []
+    for name in names:
+        grammar, start = grammars.generators[name]()
+        for length in lengths:
+            rng    = random.Random(seed + length)
+            tokens = sentences.sentence(grammar, start, length, rng)
+            for kind, toks in (("valid", tokens), ("broken", sentences.broken(tokens, 2, rng))):
+                case = measure(name, grammar, start, toks, repeat, limit)
+                case["kind"] = kind
+                cases.append(case)
+                report(case)
+    return {
+        "python":  platform.python_version(),
+        "machine": platform.machine(),
+        "time":    time.time(),
+        "cases":   cases,
+    }
+
+def key(case):
+    return case["name"], case["kind"], case["tokens"]
+
+def report(case, old=None):
+    line = "{:>10} {:>6} {:>5}".format(case["name"], case["kind"], case["tokens"])
+    for phase, took in case["phases"].items():
+        line += " {}={:.4f}".format(phase, took)
+        if old is not None and old["phases"].get(phase):
+            line += "({:.2f}x)".format(old["phases"][phase] / took if took else 0.0)
+    line += " peak={:.1f}KB".format(case["peak_bytes"] / 1024)
+    print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="grammarboy benchmarks")
+    parser.add_argument("--grammars", default=",".join(grammars.generators))
+    parser.add_argument("--lengths", default="10,20,40")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=1000, help="results to enumerate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the results to this json file")
+    parser.add_argument("--compare", help="print speedups against this json file")
+    args = parser.parse_args(argv)
+    lengths = [int(n) for n in args.lengths.split(",")]
+    data = run(args.grammars.split(","), lengths, args.repeat, args.limit, args.seed)
+    if args.out:
+        with open(args.out, "w") as fd:
+            json.dump(data, fd, indent=2)
+    if args.compare:
+        with open(args.compare) as fd:
+            old = dict((key(case), case) for case in json.load(fd)["cases"])
+        print("against {}:".format(args.compare))
+        for case in data["cases"]:
+            if key(case) in old:
+                report(case, old[key(case)])
+
+if __name__=='__main__':
+    main(sys.argv[1:])
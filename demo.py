@@ -1,8 +1,5 @@
 from grammarboy import Grammar, keyword, near, far, tokenize, relevant_ruleset, visualize_intervals
 
-# keywords for the tokenizer, could be derived from the grammar itself.
-keywords = {'return', 'and', 'or'}
-
 # stores the guidance strings
 guide = {}
 
@@ -61,24 +58,52 @@ guide[_or]  = "logical or"
 def i_or(expr, env):
     return expr[0] or expr[2]
 
-while True:
-    text = input("> ")
-    results = grammar.parse(list(tokenize(text, keywords)))
-    success = False
-    goals = {'expr'}
-    for result in results.just(1):
-        if result.ambiguity == 1 and result[0] in goals:
-            print(result.traverse(interpret, {})[0])
-            success = True
-    if not success:
-        for string in visualize_intervals(results):
-            print("  " + string)
-        for rule in sorted(relevant_ruleset(results), key=lambda rule: rule.var):
-            out = []
-            for cell in rule:
-                if isinstance(cell, keyword):
-                    out.append(cell.val)
-                else:
-                    out.append("<"+cell+">")
-            print("{:>8} := {:30} # {:30}".format(rule.var, ' '.join(out), guide.get(rule, '')))
-        print()
+# keywords for the tokenizer.
+keywords = grammar.keywords()
+
+# parses every line read, prints its value or why it did not parse.
+def repl():
+    results = None
+    while True:
+        text = input("> ")
+        tokens = list(tokenize(text, keywords))
+        if results is None:
+            results = grammar.parse(tokens)
+        else:
+            results = grammar.reparse(results, tokens)
+        success = False
+        goals = {'expr'}
+        for result in results.just(1):
+            if result.ambiguity == 1 and result[0] in goals:
+                print(result.traverse(interpret, {})[0])
+                success = True
+        if not success:
+            for string in visualize_intervals(results):
+                print("  " + string)
+            for rule in sorted(relevant_ruleset(results), key=lambda rule: rule.var):
+                out = []
+                for cell in rule:
+                    if isinstance(cell, keyword):
+                        out.append(cell.val)
+                    else:
+                        out.append("<"+cell+">")
+                print("{:>8} := {:30} # {:30}".format(rule.var, ' '.join(out), guide.get(rule, '')))
+            print()
+
+# answers the json lines of service.serve(), python demo.py --serve PORT
+def serve(port):
+    import asyncio
+    from grammarboy import service
+    async def run():
+        server = await service.serve(grammar, port=port, goals={'expr', 'stmt'})
+        print("serving on port {}".format(server.sockets[0].getsockname()[1]))
+        async with server:
+            await server.serve_forever()
+    asyncio.run(run())
+
+if __name__=='__main__':
+    import sys
+    if sys.argv[1:2] == ["--serve"]:
+        serve(int(sys.argv[2]) if len(sys.argv) > 2 else 0)
+    else:
+        repl()
@@ -1,4 +1,5 @@
-from . import cyk
+import array, re, sys, threading
+from . import analysis, completion, cyk, forest
 
 def main():
     grammar = Grammar()
@@ -18,15 +19,35 @@ def main():
     for key, item in distances.items():
         print(key, item)
 
+# the length sequences of the shortest covers of the tokens,
+# walked over mintab without enumerating the symbols.
 def intervals(results):
+    n = len(results.tab[0])
+    mintab = results.mintab
     iv = set()
-    for result in results.just(results.shortest):
-        interval = []
-        for var, length, count in result.trees:
-            interval.append(length)
-        iv.add(tuple(interval))
+    stack = [(0, ())]
+    while stack:
+        index, interval = stack.pop()
+        if index == n:
+            if interval:
+                iv.add(interval)
+            continue
+        for length in shortest_lengths(mintab, n, index, results.tab.lengths(index)):
+            stack.append((index+length, interval + (length,)))
     return iv
 
+# the lengths of the pieces at index that some shortest cover continues with,
+# lengths are those of the cells at index, by default every one of them.
+def shortest_lengths(mintab, n, index, lengths=None):
+    best = mintab[0][index]
+    if best > n:
+        return
+    if lengths is None:
+        lengths = range(1, min(n-index, len(mintab)-1) + 1)
+    for length in lengths:
+        if mintab[length][index] == best:
+            yield length
+
 def visualize_intervals(results):
     tokens = results.tab[0]
     for interval in sorted(intervals(results)):
@@ -47,124 +68,298 @@ def visualize_intervals(results):
         yield s
 
 def relevant_ruleset(results):
-    inversions = rule_inversions(results.grammar)
+    inversions = results.grammar.analysis.inversions
+    symbols  = results.cnf.symbols
+    implicit = results.cnf.implicit
+    n = len(results.tab[0])
     ruleset = set()
-    for result in results.just(results.shortest):
-        inv = []
-        for cell in result:
-            for index, rule in inversions.get(cell, ()):
-                if len(rule) > 1:
-                    ruleset.add(rule)
-    return ruleset 
+    reached = {0}
+    for index in range(n):
+        if index not in reached:
+            continue
+        for length in shortest_lengths(results.mintab, n, index, results.tab.lengths(index)):
+            reached.add(index+length)
+            for var in results.tab[length][index]:
+                if implicit[var]:
+                    continue
+                for _, rule in inversions.get(symbols[var], ()):
+                    if len(rule) > 1:
+                        ruleset.add(rule)
+    return ruleset
 
 def rule_inversions(grammar):
-    inversions = {}
-    for rule in grammar.rules:
-        for index, cell in enumerate(rule):
-            if cell not in inversions:
-                inversions[cell] = []
-            inversions[cell].append((index, rule))
-    return inversions
+    return grammar.analysis.inversions
 
 def completion_distance_to(grammar, lengths, groups, goals):
-    distance = {}
-    queue = []
-    for goal in goals:
-        distance[goal] = 0
-        queue.append(goal)
-    while queue:
-        current   = queue.pop(0)
-        d_current = distance[current]
-        for rule in groups.get(current, ()):
-            weight = sum(lengths[cell] for cell in rule)
-            for cell in rule:
-                d = weight - lengths[cell] + d_current
-                if cell in distance:
-                    distance[cell] = min(distance[cell], d)
-                else:
-                    queue.append(cell)
-                    distance[cell] = d
-        queue.sort(key=lambda cell: distance[cell])
-    return distance
+    return completion.distances(grammar, lengths, groups, goals)
+
+# completion_distance_to() for the grammar's own tables, once per goal set.
+def completion_distances(grammar, goals):
+    goals = frozenset(goals)
+    def compute():
+        lengths, _ = shortest_sequences(grammar)
+        return completion.distances(grammar, lengths, rules_by_nonterminal(grammar), goals)
+    return grammar.analysis.cached(("distances", goals), compute)
 
 def shortest_sequences(grammar):
-    lengths = {}
-    sequences = {}
-    for term in grammar.terminals:
-        lengths[term] = 1
-        sequences[term] = [term]
-    for term in grammar.cnf.specifiers:
-        lengths[term] = 1
-        sequences[term] = [term]
-
-    def price_sum(rule):
-        price = 0
-        for cell in rule:
-            if cell not in lengths:
-                return None
-            price += lengths[cell]
-        return price
-
-    unrelaxed = True
-    while unrelaxed:
-        unrelaxed = False
-        for rule in grammar.rules:
-            p = price_sum(rule)
-            if p:
-                cat = []
-                for cell in rule:
-                    cat += sequences[cell]
-                was = lengths.get(rule.var, p+1)
-                lengths[rule.var] = min(p,was)
-                if p < was:
-                    sequences[rule.var] = cat
-                unrelaxed |= p < was
-
-    rule_sequences = {}
-    for rule in grammar.rules:
-        cat = []
-        for cell in rule:
-            cat += sequences[cell]
-        rule_sequences[rule] = cat
-    return lengths, rule_sequences
+    def compute():
+        lengths, _, sequences = grammar.analysis.shortest
+        rule_sequences = {}
+        for rule in grammar.analysis.rules:
+            if all(cell in sequences for cell in rule):
+                rule_sequences[rule] = [term for cell in rule for term in sequences[cell]]
+        return lengths, rule_sequences
+    return grammar.analysis.cached("sequences", compute)
+
+# the k cheapest ways to finish the input of table as one of the goals,
+# as completion.Completion objects.
+def suggest_completions(table, goals, k=5):
+    lengths = table.grammar.analysis.cached("lengths", lambda: completion.Lengths(table.cnf))
+    if lengths.cnf is not table.cnf:
+        lengths = completion.Lengths(table.cnf)
+    return completion.suggest(table, goals, k, lengths)
 
 def rules_by_nonterminal(grammar):
-    nonterminals = {}
-    for rule in grammar.rules:
-        if rule.var not in nonterminals:
-            nonterminals[rule.var] = []
-        nonterminals[rule.var].append(rule)
-    return nonterminals
+    return grammar.analysis.groups
+
+# held while a grammar is compiled.
+compiling = threading.Lock()
 
+# cache, a cache.CompileCache, keeps the compiled form on disk.
+# Rules and terminals added after compiling are queued, the next
+# access to cnf extends the compiled form with them.
 class Grammar:
-    def __init__(self, rules=None, terminals=None):
+    def __init__(self, rules=None, terminals=None, cache=None):
         self.rules = rules or set()
         self.terminals = terminals or set()
+        self.cache = cache
         self._cnf = None
+        self._pending = [], []
+        self._analysis = None
 
+    # compiled under a lock, so threads that parse with one grammar
+    # compile it and apply the pending rules once.
     @property
     def cnf(self):
-        if self._cnf is None:
-            self._cnf = cyk.cnf(self.rules, self.terminals)
-        return self._cnf
-        
+        if self._cnf is not None and self._pending == ([], []):
+            return self._cnf
+        with compiling:
+            if self._cnf is None:
+                if self.cache is None:
+                    self._cnf = cyk.cnf(self.rules, self.terminals)
+                else:
+                    self._cnf = self.cache.compile(self)
+                self._pending = [], []
+            elif self._pending != ([], []):
+                rules, terminals = self._pending
+                self._cnf = self._cnf.extend(rules, terminals)
+                self._pending = [], []
+            return self._cnf
+
     def rule(self, var, *sequence):
         rule = Rule(var, sequence)
         self.rules.add(rule)
+        self._pending[0].append(rule)
+        self._analysis = None
         return rule
 
     def terminal(self, sym):
-        self.terminals.add(sym)
-    
+        if sym not in self.terminals:
+            self.terminals.add(sym)
+            self._pending[1].append(sym)
+            self._analysis = None
+
+    # the analysis.Analysis of the rules, kept until the grammar changes.
+    @property
+    def analysis(self):
+        if self._analysis is None:
+            self._analysis = analysis.Analysis(self.rules, self.terminals)
+        return self._analysis
+
+    # the words of the keyword specifiers, for tokenize().
+    def keywords(self):
+        words = set()
+        for rule in self.rules:
+            for cell in rule:
+                while isinstance(cell, (near, far)):
+                    cell = cell.sym
+                if isinstance(cell, keyword):
+                    words.add(cell.val)
+        return words
+
+    # workers compile their own copy.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_cnf'] = None
+        state['_pending'] = [], []
+        state['_analysis'] = None
+        return state
+
+    # reuses the compiled form of self when there is one, and the
+    # analysis of self or else of other, extended by the rules of the other.
     def __add__(self, other):
-        return Grammar(self.rules | other.rules, self.terminals | other.terminals)
+        grammar = Grammar(self.rules | other.rules, self.terminals | other.terminals,
+            self.cache or other.cache)
+        rules = [rule for rule in other.rules if rule not in self.rules]
+        terminals = [term for term in other.terminals if term not in self.terminals]
+        if self._cnf is not None:
+            grammar._cnf = self.cnf.extend(rules, terminals)
+        if self._analysis is not None:
+            grammar._analysis = self._analysis.extend(rules, terminals)
+        elif other._analysis is not None:
+            grammar._analysis = other._analysis.extend(self.rules, self.terminals)
+        return grammar
+
+    # structure="lazy" fills only the counts, the structure table
+    # is then rebuilt for the cells that traverse() and explain() visit.
+    # workers fills each span length on that many processes.
+    # stats=True gives the table an instrument.Stats.
+    # goals are the symbols the earley engine looks for, all by default.
+    # max_span fills only the spans up to that many tokens long, the
+    # results are then sequences of such spans.
+    def parse(self, tokens, engine="cyk", structure="full", workers=None, stats=False, goals=None, max_span=None):
+        if structure not in ("full", "lazy"):
+            raise ValueError("structure must be 'full' or 'lazy', not {!r}".format(structure))
+        if not isinstance(tokens, TokenBuffer):
+            tokens = list(tokens)
+        if stats:
+            from . import instrument
+            return instrument.parse(self, tokens, engine, structure == "full", workers, goals, max_span)
+        cnf = self.cnf
+        tab, apl, mintab = recognizer(engine, workers, goals, max_span)(tokens, cnf, structure == "full")
+        return Table(self, tab, apl, mintab, cnf, complete=engine != "earley")
+
+    # await grammar.parse_async(tokens, deadline=0.05), see service.parse().
+    # Gives a service.Partial table when the deadline passes first,
+    # raises service.Superseded when a newer parse of session came.
+    async def parse_async(self, tokens, deadline=None, session=None, executor=None, structure="full"):
+        from . import service
+        if structure not in ("full", "lazy"):
+            raise ValueError("structure must be 'full' or 'lazy', not {!r}".format(structure))
+        if not isinstance(tokens, TokenBuffer):
+            tokens = list(tokens)
+        return await service.parse(self, tokens, deadline, session, executor, structure)
+
+    # parses every token list of streams, yields a parallel.Summary for each.
+    def parse_many(self, streams, goals, workers=None, chunksize=1, ordered=True, visitor=None, args=()):
+        from . import parallel
+        return parallel.parse_many(self, streams, goals, workers, chunksize, ordered, visitor, args)
+
+    # parses tokens a segment at a time, see document.split() for the
+    # boundaries, gives a document.Document of the segments.
+    def parse_document(self, tokens, goals, boundary="line", workers=None, engine="cyk", join=8):
+        from . import document
+        return document.parse(self, tokens, goals, boundary, workers, engine, join)
+
+    def recognize(self, tokens, goals):
+        table = self.parse(tokens, structure="lazy")
+        n = len(table.tab[0])
+        if n == 0:
+            return False
+        symbols = table.cnf.symbols
+        return any(symbols[var] in goals for var in table.tab[n][0])
+
+    def parser(self):
+        return Parser(self)
+
+    # parses tokens that were produced by editing the input of table.
+    # The cells are reused only from a complete table, other tables
+    # are parsed again from the start.
+    def reparse(self, table, tokens):
+        if not isinstance(tokens, TokenBuffer):
+            tokens = list(tokens)
+        cnf = self.cnf
+        if table.cnf is not cnf or not table.complete:
+            return self.parse(tokens, max_span=table.tab.width)
+        old_apl = None if isinstance(table.apl, cyk.Structure) else table.apl
+        tab, apl, mintab = cyk.recyk(table.tab, old_apl, tokens, cnf)
+        return Table(self, tab, apl, mintab, cnf)
+
+def numpy_engine(tokens, cnf, structure=True):
+    from . import npcyk
+    return npcyk.cyk(tokens, cnf, structure)
+
+def earley_engine(tokens, cnf, structure=True, goals=None):
+    from . import earley
+    return earley.earley(tokens, cnf, structure, goals)
+
+# the recognizers available to Grammar.parse,
+# numpy is imported only when its engine is asked for.
+engines = {
+    "cyk":    cyk.cyk,
+    "numpy":  numpy_engine,
+    "earley": earley_engine,
+}
+
+def recognizer(engine, workers=None, goals=None, max_span=None):
+    if max_span is not None:
+        if engine != "cyk" or workers is not None or goals is not None:
+            raise ValueError("max_span is only supported by the serial cyk engine")
+        if max_span < 1:
+            raise ValueError("max_span must be at least 1, not {!r}".format(max_span))
+        return lambda tokens, cnf, structure: cyk.cyk(tokens, cnf, structure, max_span)
+    if goals is not None:
+        if engine != "earley" or workers is not None:
+            raise ValueError("goals are only supported by the earley engine")
+        return lambda tokens, cnf, structure: earley_engine(tokens, cnf, structure, goals)
+    if workers is None:
+        return engines[engine]
+    if engine != "cyk":
+        raise ValueError("workers are only supported by the cyk engine")
+    from . import parallel
+    return lambda tokens, cnf, structure: parallel.cyk(tokens, cnf, structure, workers)
+
+# Parses tokens as they arrive, the table grows by one column per token.
+class Parser:
+    def __init__(self, grammar):
+        self.grammar = grammar
+        self.cnf = grammar.cnf
+        self.tab, self.apl = cyk.chart([])
+        self.best   = [0] # fewest pieces that cover the first n tokens.
+        self._table = None
+
+    def feed(self, token):
+        cyk.extend(self.tab, self.apl, token, self.cnf)
+        implicit = self.cnf.implicit
+        n = len(self.tab[0])
+        score = n + 1
+        for length in range(1, n+1):
+            for var in self.tab[length][n-length]:
+                if not implicit[var]:
+                    score = min(score, self.best[n-length] + 1)
+                    break
+        self.best.append(score)
+        self._table = None
+
+    def extend(self, tokens):
+        for token in tokens:
+            self.feed(token)
+
+    def __len__(self):
+        return len(self.tab[0])
 
-    def parse(self, tokens):
-        tokens = list(tokens)
-        tab, apl, mintab = cyk.cyk(tokens, self.cnf)
-        return Table(self, tab, apl, mintab)
+    @property
+    def shortest(self):
+        return self.best[-1]
+
+    # a snapshot of the parse so far, later tokens do not alter it.
+    @property
+    def table(self):
+        if self._table is None:
+            tokens = list(self.tab.tokens)
+            tab = self.tab.copy(tokens)
+            apl = self.apl.copy(tokens)
+            mintab = cyk.build_mintab(tab, self.cnf)
+            self._table = Table(self.grammar, tab, apl, mintab, self.cnf)
+        return self._table
+
+    @property
+    def mintab(self):
+        return self.table.mintab
 
 class Rule:
+    __slots__ = ('var', 'row')
+
     def __init__(self, var, row):
         self.var = var
         self.row = row
@@ -181,49 +376,153 @@ class Rule:
     def __repr__(self):
         return "{} <- {}".format(self.var, ' '.join(map(str,self.row)))
 
+# the cells of tab are keyed by symbol ids of the cnf,
+# results translate them back to the grammar symbols.
+# stats is None unless the parse was instrumented.
+# complete is False when a cell may lack some symbol that derives its
+# span, as the earley engine and a parse cut by a deadline leave them.
 class Table:
-    def __init__(self, grammar, tab, apl, mintab):
+    def __init__(self, grammar, tab, apl, mintab, cnf=None, stats=None, complete=True):
         self.grammar = grammar
+        self.cnf    = cnf or grammar.cnf
         self.tab    = tab
-        self.apl    = apl
+        self.apl    = apl if apl is not None else cyk.Structure(tab, self.cnf)
         self.mintab = mintab
+        self.stats  = stats
+        self.complete = complete
         self._length = None
+        self._counts = None
+        self._forest = None
         self.shortest = mintab[0][0]
     
     def __len__(self):
         if self._length is None:
-            self._length = cyk.count(self.tab)
+            self._length = cyk.count(self.tab, self.cnf)
         return self._length
 
+    # the shared packed parse forest of the table.
+    def forest(self):
+        if self._forest is None:
+            self._forest = forest.Forest(self)
+        return self._forest
+
     def just(self, length):
         assert length >= 1
         yield from iter_results(self, length)
 
     def __iter__(self):
-        for i in range(1, len(self.tab)):
-            yield from iter_results(self, i)
+        return self.results()
+
+    # the results by size, smallest first, at most limit of them
+    # and none of more than max_size pieces.
+    def results(self, limit=None, max_size=None):
+        n = len(self.tab[0])
+        if max_size is None or max_size > n:
+            max_size = n
+        for size in range(max(1, self.shortest), max_size+1):
+            for result in iter_results(self, size):
+                if limit is not None:
+                    if limit <= 0:
+                        return
+                    limit -= 1
+                yield result
+
+    # the result at rank in the order of iter(table).
+    def result(self, rank):
+        if self._counts is None:
+            self._counts = cyk.counts(self.tab, self.cnf)
+        counts = self._counts
+        total  = sum(counts[0][1:])
+        if rank < 0:
+            rank += total
+        if not 0 <= rank < total:
+            raise IndexError("result rank out of range")
+        size = 1
+        while rank >= counts[0][size]:
+            rank -= counts[0][size]
+            size += 1
+        symbols  = self.cnf.symbols
+        implicit = self.cnf.implicit
+        index = 0
+        trees = []
+        ambiguity = 1
+        while size > 0:
+            for length, var, count in pieces(self, index, size):
+                below = counts[index+length]
+                below = below[size-1] if size-1 < len(below) else 0
+                if rank < below:
+                    break
+                rank -= below
+            trees.append((symbols[var], length, count))
+            ambiguity *= count
+            index += length
+            size  -= 1
+        return Result(self, ambiguity, trees)
+
+def iter_results(table, size=1):
+    if table.stats is None:
+        return walk_results(table, size)
+    return table.stats.timed("enumerate", walk_results(table, size))
+
+# walks the results of size pieces depth first, with a stack of
+# the pieces left to try at each depth, mintab cuts the branches
+# that can not cover the rest in the pieces left.
+def walk_results(table, size):
+    n = len(table.tab[0])
+    if size > n:
+        return
+    symbols = table.cnf.symbols
+    trees   = []
+    ambiguity = [1]
+    index     = [0]
+    stack = [pieces(table, 0, size)]
+    while stack:
+        piece = next(stack[-1], None)
+        if piece is None:
+            stack.pop()
+            if trees:
+                trees.pop()
+                ambiguity.pop()
+                index.pop()
+            continue
+        length, var, count = piece
+        trees.append((symbols[var], length, count))
+        ambiguity.append(ambiguity[-1] * count)
+        index.append(index[-1] + length)
+        if len(trees) == size:
+            yield Result(table, ambiguity[-1], list(trees))
+            trees.pop()
+            ambiguity.pop()
+            index.pop()
+        else:
+            stack.append(pieces(table, index[-1], size - len(trees)))
 
-def iter_results(table, size=1, index=0, prefix=[], ambiguity=1):
+# the pieces at index that leave a rest coverable in size-1 pieces,
+# longest first.
+def pieces(table, index, size):
     n = len(table.tab[0])
-    if size == 0 and index == n:
-        yield Result(table, ambiguity, prefix)
-    elif size > 0:
-        for length in range(1+n-size-index, 0, -1):
-            for var, count in table.tab[length][index].items():
-                if isinstance(var, cyk.Implicit):
-                    continue
-                yield from iter_results(table, size - 1, index+length, prefix + [(var,length,count)], ambiguity*count)
+    mintab   = table.mintab
+    implicit = table.cnf.implicit
+    limit    = 1+n-size-index
+    for length in reversed(table.tab.lengths(index)):
+        if length > limit or mintab[length][index] > size:
+            continue
+        for var, count in table.tab[length][index].items():
+            if not implicit[var]:
+                yield length, var, count
 
 class Result:
+    __slots__ = ('table', 'ambiguity', 'trees')
+
     def __init__(self, table, ambiguity, trees):
         self.table     = table
         self.ambiguity = ambiguity
         self.trees     = trees
 
-    def traverse(self, visitor=None, *args):
+    def traverse(self, visitor=None, *args, memo=None):
         if self.ambiguity > 1:
             raise TypeError("Ambiguous result does not produce unambiguous traversal")
-        return traverse(self.table, self.trees, visitor, args)
+        return traverse(self.table, self.trees, visitor, args, memo)
 
     def explain(self):
         return explain(self.table, self.trees)
@@ -238,52 +537,66 @@ class Result:
     def __getitem__(self, index):
         return self.trees[index][0]
 
-def traverse(table, trees, visitor, args):
-    index = 0
-    output = []
+# memo, if given, is a dict that keeps the output of the visitor
+# for every (var, index, length), it may be shared by the traversals
+# that use the same visitor and args.
+def traverse(table, trees, visitor, args, memo=None):
     if visitor is None:
         visitor = lambda rule, lst: [rule] + lst
-    for var, length, _ in trees:
-        output.append(traverse_item(table, var, length, index, visitor, args))
-        index += length
-    return output
-
-def traverse_item(table, var, length, index, visitor, args):
-    if length == 1:
-        obj = None
-        for obj, k in table.apl[length][index]:
-            if obj.var == var:
-                break
-            obj = None
-        if isinstance(obj, cyk.Lead):
-            return visitor(obj.rule, [traverse_item(table, obj.node, length, index, visitor, args)], *args)
-        if obj and not isinstance(obj.var, cyk.Specifier):
-            return visitor(obj.rule, [table.tab[0][index]], *args)
+    return [traverse_node(node, visitor, args, memo) for node in table.forest().cover(trees)]
+
+# follows the first alternative of every node, children first,
+# with an explicit stack so deep trees do not exhaust the recursion.
+# The outputs of the children wait on the values stack.
+def traverse_node(node, visitor, args, memo=None):
+    values = []
+    stack  = [(node, False)]
+    while stack:
+        node, ready = stack.pop()
+        key = node.var, node.index, node.length
+        if memo is not None and not ready and key in memo:
+            values.append(memo[key])
+            continue
+        token = node.token
+        if token is not None:
+            values.append(token)
+            continue
+        alt = node.alternatives[0]
+        if not ready:
+            stack.append((node, True))
+            for child in reversed(alt.children):
+                if isinstance(child, forest.Node):
+                    stack.append((child, False))
+            continue
+        if alt.middle is None:
+            child = alt.children[0]
+            if isinstance(child, forest.Node):
+                child = values.pop()
+            value = visitor(alt.rule, [child], *args)
         else:
-            return table.tab[0][index]
-
-    for obj, k in table.apl[length][index]:
-        if obj.var == var:
-            break
-    
-    if isinstance(obj, cyk.Lead):
-        return visitor(obj.rule, [traverse_item(table, obj.node, length, index, visitor, args)], *args)
-
-    lhs_length, lhs_index = cyk.lhs_coords(length, index, k)
-    rhs_length, rhs_index = cyk.rhs_coords(length, index, k)
-
-    left  = traverse_item(table, obj.lhs, lhs_length, lhs_index, visitor, args)
-    right = traverse_item(table, obj.rhs, rhs_length, rhs_index, visitor, args)
-    if isinstance(obj.var, cyk.Implicit):
-        return [left, right]
-    if isinstance(obj.rhs, cyk.Implicit):
-        return visitor(obj.rule, [left] + right, *args)
-    return visitor(obj.rule, [left, right], *args)
-
+            right = values.pop()
+            left  = values.pop()
+            # the suffix of a rule comes out as a flat list of its parts.
+            if alt.children[1].implicit:
+                parts = [left] + right
+            else:
+                parts = [left, right]
+            if node.implicit:
+                value = parts
+            else:
+                value = visitor(alt.rule, parts, *args)
+        if memo is not None:
+            memo[key] = value
+        values.append(value)
+    return values.pop()
+
+# every entry of the structure table for the pieces, middle is the
+# split k, for a unit rule the split of the pair that triggered it.
 def explain(table, trees):
     index  = 0
     output = []
     for var, length, _ in trees:
+        var   = table.cnf.ids[var]
         rules = []
         for obj, k in table.apl[length][index]:
             if obj.var == var and not isinstance(obj, cyk.InitSpecifier):
@@ -293,6 +606,8 @@ def explain(table, trees):
     return output
 
 class Explanation:
+    __slots__ = ('rule', 'index', 'length', 'middle')
+
     def __init__(self, rule, index, length, middle):
         self.rule   = rule
         self.index  = index
@@ -311,12 +626,20 @@ class near(cyk.Specifier):
             return (not token.near) and self.sym.match(token)
         return token.near and token.type == self.sym
 
+    def index(self):
+        if isinstance(self.sym, cyk.Specifier):
+            return self.sym.index()
+        return "type", self.sym
+
     def __eq__(self, other):
         return type(self) == type(other) and self.sym == other.sym
 
     def __hash__(self):
         return hash((type(self), self.sym))
 
+    def key(self):
+        return self.sym,
+
     def __repr__(self):
         return "near({})".format(self.sym)
 
@@ -335,12 +658,20 @@ class far(cyk.Specifier):
             return (not token.near) and self.sym.match(token)
         return (not token.near) and token.type == self.sym
 
+    def index(self):
+        if isinstance(self.sym, cyk.Specifier):
+            return self.sym.index()
+        return "type", self.sym
+
     def __eq__(self, other):
         return type(self) == type(other) and self.sym == other.sym
 
     def __hash__(self):
         return hash((type(self), self.sym))
 
+    def key(self):
+        return self.sym,
+
     def __repr__(self):
         return "far({})".format(self.sym)
 
@@ -357,63 +688,72 @@ class keyword(cyk.Specifier):
     def match(self, token):
         return self.val == token.val
 
+    def index(self):
+        return "val", self.val
+
     def __eq__(self, other):
         return type(self) == type(other) and self.val == other.val
 
     def __hash__(self):
         return hash((type(self), self.val))
 
+    def key(self):
+        return self.val,
+
     def __repr__(self):
         return "keyword({})".format(self.val)
 
     def validate(self, terminals):
         pass
 
+# Scans with one compiled pattern over offsets of text, so the time is
+# linear in its length. text is a str, or bytes or any other buffer
+# such as an mmap, that is scanned as ascii.
+# The first line sits at location + column. A newline moves the line
+# to the next thousand after it, and the later lines sit at line + column + 1.
 def tokenize(text, keywords, location=1000):
-    ch  = None
-    pos = location - 2
+    if isinstance(text, str):
+        scanner = str_scanner
+        decode  = str
+    else:
+        scanner = bytes_scanner
+        decode  = lambda string: string.decode('latin-1')
+    base = location - 1 # position of the first column of the current line
+    line = 0            # offset of the first column of the current line
     near = True
-    def advance():
-        nonlocal ch, text, pos
-        last = ch
-        ch   = text[:1]
-        text = text[1:]
-        pos += 1
-        if last == '\n':
-            pos = 1000 + pos // 1000 * 1000
-        return last
-    def token(type, val):
-        nonlocal near
-        w = near
-        near  = True
-        return Token(pos - len(string) + 1, len(string), type, val, w)
-    advance()
-    while ch:
-        string = ""
-        if issym(ch):
-            while issym(ch):
-                string += advance()
-            if string in keywords:
-                yield token("keyword", string)
-            else:
-                yield token("sym", string)
-        elif ch == " ":
-            while ch == " ":
-                string += advance()
+    for match in scanner.finditer(text):
+        kind  = match.lastindex
+        start = match.start()
+        if kind == SPACE:
             near = False
-        elif isnum(ch):
-            while isnum(ch):
-                string += advance()
-            yield token("num", int(string))
+            continue
+        string = match.group()
+        if kind == NEWLINE:
+            base = 1000 + (base + start - line + 1) // 1000 * 1000
+            line = start + 1
+            yield Token(base, 1, "unk", decode(string), near)
         else:
-            string += advance()
-            yield token("unk", string)
+            pos = base + start - line + 1
+            if kind == SYM:
+                string = decode(string)
+                yield Token(pos, len(string), "keyword" if string in keywords else "sym", string, near)
+            elif kind == NUM:
+                yield Token(pos, len(string), "num", int(string), near)
+            else:
+                yield Token(pos, 1, "unk", decode(string), near)
+        near = True
+
+SYM, SPACE, NUM, NEWLINE, UNK = range(1, 6)
+str_scanner   = re.compile(r"([^\W\d_]+)|( +)|(\d+)|(\n)|(.)", re.DOTALL)
+bytes_scanner = re.compile(rb"([A-Za-z]+)|( +)|([0-9]+)|(\n)|(.)", re.DOTALL)
 
 issym   = lambda text: text.isalpha()
 isnum   = lambda text: text.isdigit()
 isspace = lambda text: text.isspace()
 
 class Token:
+    __slots__ = ('pos', 'length', 'type', 'val', 'near')
+
     def __init__(self, pos, length, type, val, near):
         self.pos    = pos
         self.length = length
@@ -424,5 +764,64 @@ class Token:
     def __repr__(self):
         return "{0.type} {0.val!r} at {0.pos}".format(self)
 
+# Tokens kept in columns rather than as an object each: the positions,
+# lengths and type numbers in arrays, the near flags in a bytearray and
+# the values in a list beside them, the strings interned as the same
+# words repeat. Grammar.parse takes it as it is, indexing it makes a
+# Token on the spot, slicing it makes a TokenBuffer.
+#
+#     tokens = TokenBuffer(tokenize(text, keywords))
+class TokenBuffer:
+    __slots__ = ('pos', 'length', 'kind', 'near', 'val', 'types', 'kinds')
+
+    def __init__(self, tokens=()):
+        self.pos    = array.array('q')
+        self.length = array.array('i')
+        self.kind   = array.array('i') # index to types
+        self.near   = bytearray()
+        self.val    = []
+        self.types  = []
+        self.kinds  = {}               # type -> index to types
+        self.extend(tokens)
+
+    def append(self, token):
+        kind = self.kinds.get(token.type)
+        if kind is None:
+            kind = self.kinds[token.type] = len(self.types)
+            self.types.append(token.type)
+        self.pos.append(token.pos)
+        self.length.append(token.length)
+        self.kind.append(kind)
+        self.near.append(bool(token.near))
+        self.val.append(sys.intern(token.val) if type(token.val) is str else token.val)
+
+    def extend(self, tokens):
+        for token in tokens:
+            self.append(token)
+
+    def __len__(self):
+        return len(self.val)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            out = TokenBuffer()
+            out.pos    = self.pos[index]
+            out.length = self.length[index]
+            out.kind   = self.kind[index]
+            out.near   = self.near[index]
+            out.val    = self.val[index]
+            out.types  = list(self.types)
+            out.kinds  = dict(self.kinds)
+            return out
+        return Token(self.pos[index], self.length[index], self.types[self.kind[index]],
+            self.val[index], bool(self.near[index]))
+
+    def __iter__(self):
+        for index in range(len(self.val)):
+            yield self[index]
+
+    def __repr__(self):
+        return "<TokenBuffer of {} tokens>".format(len(self.val))
+
 if __name__=='__main__':
     main()
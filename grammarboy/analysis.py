@@ -0,0 +1,130 @@
+# Tables derived from the rules of a grammar, computed on first use.
+# An Analysis holds a snapshot of the rules and the terminals, so it
+# stays right after the grammar changes, Grammar.analysis gives a new
+# one once a rule or a terminal has been added.
+# The tables are shared with every caller, do not modify them.
+from . import completion
+
+class Analysis:
+    def __init__(self, rules, terminals):
+        self.rules = frozenset(rules)
+        self.terminals = frozenset(terminals)
+        self._tables = {}
+
+    # a derived table by key, compute() gives it the first time.
+    def cached(self, key, compute):
+        if key not in self._tables:
+            self._tables[key] = compute()
+        return self._tables[key]
+
+    # symbol -> [(index, rule)] of the rules it appears in.
+    @property
+    def inversions(self):
+        return self.cached("inversions", lambda: inversions(self.rules))
+
+    # nonterminal -> [rule]
+    @property
+    def groups(self):
+        return self.cached("groups", lambda: groups(self.rules))
+
+    # (lengths, best, sequences) from completion.shortest()
+    @property
+    def shortest(self):
+        return self.cached("shortest", lambda: completion.shortest(self))
+
+    # the symbols that derive some token sequence.
+    @property
+    def productive(self):
+        return self.cached("productive", lambda: frozenset(self.shortest[0]))
+
+    # the nonterminals that derive the empty sequence.
+    @property
+    def nullable(self):
+        return self.cached("nullable", lambda: nullable(self.rules))
+
+    # the symbols reachable from the goals through the rules.
+    def reachable(self, goals):
+        goals = frozenset(goals)
+        return self.cached(("reachable", goals), lambda: reachable(self.groups, goals))
+
+    # the symbols that appear in no parse of the goals, either because
+    # they derive nothing or because the goals do not reach them.
+    # Without goals only the unproductive symbols are useless.
+    def useless(self, goals=None):
+        key = ("useless", None if goals is None else frozenset(goals))
+        return self.cached(key, lambda: useless(self, goals))
+
+    # the analysis of the grammar with rules and terminals added,
+    # the indexes computed so far are extended instead of recomputed.
+    def extend(self, rules, terminals):
+        rules = [rule for rule in rules if rule not in self.rules]
+        terminals = [term for term in terminals if term not in self.terminals]
+        if not rules and not terminals:
+            return self
+        other = Analysis(self.rules.union(rules), self.terminals.union(terminals))
+        if "inversions" in self._tables:
+            table = dict((sym, list(rows)) for sym, rows in self._tables["inversions"].items())
+            other._tables["inversions"] = invert(table, rules)
+        if "groups" in self._tables:
+            table = dict((var, list(rows)) for var, rows in self._tables["groups"].items())
+            other._tables["groups"] = group(table, rules)
+        return other
+
+def inversions(rules):
+    return invert({}, rules)
+
+def invert(table, rules):
+    for rule in rules:
+        for index, cell in enumerate(rule):
+            if cell not in table:
+                table[cell] = []
+            table[cell].append((index, rule))
+    return table
+
+def groups(rules):
+    return group({}, rules)
+
+def group(table, rules):
+    for rule in rules:
+        if rule.var not in table:
+            table[rule.var] = []
+        table[rule.var].append(rule)
+    return table
+
+def nullable(rules):
+    found = set()
+    changed = True
+    while changed:
+        changed = False
+        for rule in rules:
+            if rule.var not in found and all(cell in found for cell in rule):
+                found.add(rule.var)
+                changed = True
+    return frozenset(found)
+
+def reachable(groups, goals):
+    seen  = set(goals)
+    stack = list(goals)
+    while stack:
+        for rule in groups.get(stack.pop(), ()):
+            for cell in rule:
+                if cell not in seen:
+                    seen.add(cell)
+                    stack.append(cell)
+    return frozenset(seen)
+
+def useless(analysis, goals):
+    symbols = set(analysis.terminals)
+    for rule in analysis.rules:
+        symbols.add(rule.var)
+        symbols.update(rule)
+    dead = symbols - analysis.productive
+    if goals is None:
+        return frozenset(dead)
+    # a rule with an unproductive symbol is never used,
+    # so reachability is followed through the productive rules only.
+    live = {}
+    for var, rules in analysis.groups.items():
+        live[var] = [rule for rule in rules if not dead.intersection(rule)]
+    goals = [goal for goal in goals if goal not in dead]
+    return frozenset(symbols - reachable(live, goals))
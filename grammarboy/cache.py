@@ -0,0 +1,116 @@
+# Keeps compiled grammars on disk, keyed by a hash of their content,
+# so a process that starts with a grammar seen before skips cyk.cnf().
+#
+# The compiled form refers to the rules and specifiers of the grammar
+# by their position in a canonical order, so a loaded CNF points at
+# the very Rule objects of the grammar it is loaded for.
+# A grammar with a specifier that has no key() is compiled every time.
+import hashlib, io, os, pickle, tempfile
+from . import cyk
+
+# bump when the layout of cyk.CNF changes.
+version = 4
+
+class CompileCache:
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits   = 0
+        self.misses = 0
+
+    # None when the grammar has no stable content hash.
+    def path(self, grammar):
+        digest = content_hash(grammar)
+        if digest is None:
+            return None
+        return os.path.join(self.directory, digest + ".cnf")
+
+    def compile(self, grammar):
+        path = self.path(grammar)
+        if path is None:
+            return cyk.cnf(grammar.rules, grammar.terminals)
+        try:
+            with open(path, 'rb') as fd:
+                cnf = loads(grammar, fd.read())
+        except (OSError, pickle.UnpicklingError, EOFError, LookupError):
+            cnf = None
+        if cnf is not None:
+            self.hits += 1
+            return cnf
+        self.misses += 1
+        cnf = cyk.cnf(grammar.rules, grammar.terminals)
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as fd:
+            fd.write(dumps(grammar, cnf))
+        os.replace(tmp, path)
+        return cnf
+
+    def __repr__(self):
+        return "CompileCache({0.directory!r}, hits={0.hits}, misses={0.misses})".format(self)
+
+# None when a specifier of the grammar has no key().
+def content_hash(grammar):
+    terms = list(map(symbol_key, grammar.terminals))
+    rules = list(map(rule_key, grammar.rules))
+    if None in terms or None in rules:
+        return None
+    digest = hashlib.sha256("grammarboy cnf {}\n".format(version).encode('utf-8'))
+    for term in sorted(terms):
+        digest.update("terminal {}\n".format(term).encode('utf-8'))
+    for rule in sorted(rules):
+        digest.update("rule {}\n".format(rule).encode('utf-8'))
+    return digest.hexdigest()
+
+# a specifier is keyed by its type and the reprs of the fields of its
+# key(), so keyword("1") and keyword(1) get keys of their own.
+def symbol_key(sym):
+    if not isinstance(sym, cyk.Specifier):
+        return repr(sym)
+    fields = sym.key()
+    if fields is None:
+        return None
+    keys = [symbol_key(field) for field in fields]
+    if None in keys:
+        return None
+    return "{}.{}({})".format(type(sym).__module__, type(sym).__qualname__, ", ".join(keys))
+
+def rule_key(rule):
+    keys = [symbol_key(cell) for cell in rule]
+    var  = symbol_key(rule.var)
+    if var is None or None in keys:
+        return None
+    return "{} <- {}".format(var, " ".join(keys))
+
+# the rules and specifiers of a grammar in canonical order.
+def references(grammar):
+    rules = sorted(grammar.rules, key=rule_key)
+    specifiers = set()
+    for rule in rules:
+        for cell in rule:
+            if isinstance(cell, cyk.Specifier):
+                specifiers.add(cell)
+    return rules, sorted(specifiers, key=symbol_key)
+
+def dumps(grammar, cnf):
+    rules, specifiers = references(grammar)
+    rule_ids = dict((id(rule), n) for n, rule in enumerate(rules))
+    spec_ids = dict((spec, n) for n, spec in enumerate(specifiers))
+    class Pickler(pickle.Pickler):
+        def persistent_id(self, obj):
+            if id(obj) in rule_ids:
+                return ("rule", rule_ids[id(obj)])
+            if isinstance(obj, cyk.Specifier) and obj in spec_ids:
+                return ("spec", spec_ids[obj])
+            return None
+    data = io.BytesIO()
+    Pickler(data, pickle.HIGHEST_PROTOCOL).dump(cnf)
+    return data.getvalue()
+
+def loads(grammar, data):
+    rules, specifiers = references(grammar)
+    refs = {"rule": rules, "spec": specifiers}
+    class Unpickler(pickle.Unpickler):
+        def persistent_load(self, pid):
+            kind, n = pid
+            return refs[kind][n]
+    return Unpickler(io.BytesIO(data)).load()
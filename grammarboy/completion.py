@@ -0,0 +1,277 @@
+# Shortest derivations and the cost of finishing an input.
+# Both are found with a priority queue: a symbol is settled when it
+# comes off the queue, and a rule is priced once all of its symbols
+# are settled (Knuth's generalization of Dijkstra's algorithm).
+import heapq, itertools
+from . import cyk
+
+# the shortest token count of every productive symbol of the grammar,
+# the rule that gives it, and the symbol sequence it expands to.
+def shortest(grammar):
+    lengths   = {}
+    best      = {}
+    sequences = {}
+    heap  = []
+    order = itertools.count()
+    users   = {}
+    pending = {}
+    for term in grammar.terminals:
+        heap.append((1, next(order), term, None))
+    for rule in grammar.rules:
+        pending[rule] = len(rule)
+        if len(rule) == 0:
+            heap.append((0, next(order), rule.var, rule))
+        for cell in rule:
+            users.setdefault(cell, []).append(rule)
+            if isinstance(cell, cyk.Specifier):
+                heap.append((1, next(order), cell, None))
+    heapq.heapify(heap)
+    while heap:
+        length, _, sym, rule = heapq.heappop(heap)
+        if sym in lengths:
+            continue
+        lengths[sym] = length
+        best[sym]    = rule
+        if rule is None:
+            sequences[sym] = [sym]
+        else:
+            sequences[sym] = [term for cell in rule for term in sequences[cell]]
+        for user in users.get(sym, ()):
+            pending[user] -= 1
+            if pending[user] == 0:
+                price = sum(lengths[cell] for cell in user)
+                heapq.heappush(heap, (price, next(order), user.var, user))
+    return lengths, best, sequences
+
+# the tokens needed around every symbol to make one of the goals of it.
+def distances(grammar, lengths, groups, goals):
+    distance = {}
+    heap  = []
+    order = itertools.count()
+    for goal in goals:
+        heap.append((0, next(order), goal))
+    while heap:
+        d, _, current = heapq.heappop(heap)
+        if current in distance:
+            continue
+        distance[current] = d
+        for rule in groups.get(current, ()):
+            if any(cell not in lengths for cell in rule):
+                continue
+            weight = sum(lengths[cell] for cell in rule)
+            for cell in rule:
+                if cell not in distance:
+                    heapq.heappush(heap, (weight - lengths[cell] + d, next(order), cell))
+    return distance
+
+# Shortest derivations over the compiled grammar, by symbol id.
+class Lengths:
+    def __init__(self, cnf):
+        self.cnf   = cnf
+        self.pairs = {} # var -> pairs producing it
+        self.leads = {} # var -> unit rules producing it
+        for pair in cnf.pairs:
+            self.pairs.setdefault(pair.var, []).append(pair)
+        for units in cnf.units.values():
+            for lead in units:
+                self.leads.setdefault(lead.var, []).append(lead)
+        self.length = {}
+        self.back   = {}
+        derived = set(self.pairs) | set(self.leads)
+        users   = {}
+        pending = {}
+        heap  = []
+        order = itertools.count()
+        for init in cnf.inits:
+            if isinstance(init, cyk.InitSym):
+                derived.add(init.var)
+                heap.append((1, next(order), init.var, init))
+        for var in range(len(cnf.symbols)):
+            if var not in derived:
+                heap.append((1, next(order), var, None))
+        for pair in cnf.pairs:
+            pending[pair] = 2
+            users.setdefault(pair.lhs, []).append(pair)
+            users.setdefault(pair.rhs, []).append(pair)
+        for lead in itertools.chain.from_iterable(self.leads.values()):
+            pending[lead] = 1
+            users.setdefault(lead.node, []).append(lead)
+        heapq.heapify(heap)
+        while heap:
+            length, _, var, prod = heapq.heappop(heap)
+            if var in self.length:
+                continue
+            self.length[var] = length
+            self.back[var]   = prod
+            for user in users.get(var, ()):
+                pending[user] -= 1
+                if pending[user] == 0:
+                    if isinstance(user, cyk.Pair):
+                        price = self.length[user.lhs] + self.length[user.rhs]
+                    else:
+                        price = self.length[user.node]
+                    heapq.heappush(heap, (price, next(order), user.var, user))
+
+    # the terminals and specifiers of the shortest expansion of var.
+    def expand(self, var):
+        out   = []
+        stack = [var]
+        while stack:
+            var  = stack.pop()
+            prod = self.back[var]
+            if prod is None:
+                out.append(self.cnf.symbols[var])
+            elif isinstance(prod, cyk.InitSym):
+                out.append(prod.terminal)
+            elif isinstance(prod, cyk.Lead):
+                stack.append(prod.node)
+            else:
+                stack.append(prod.rhs)
+                stack.append(prod.lhs)
+        return out
+
+# The cheapest way for every symbol to start at index and run past the
+# end of the input, computed from the end of the input backwards.
+# A symbol that covers the rest costs nothing, at the end everything
+# costs its shortest expansion. Otherwise a pair either splits inside
+# the input and its right symbol runs past the end, or its left symbol
+# runs past and the right one is appended whole.
+class Finish:
+    def __init__(self, table, lengths):
+        self.table   = table
+        self.lengths = lengths
+        tab = table.tab
+        cnf = table.cnf
+        n   = len(tab[0])
+        self.n    = n
+        self.cost = [None] * (n+1)
+        self.back = [None] * (n+1)
+        self.cost[n] = lengths.length
+        self.back[n] = {}
+        for index in range(n-1, -1, -1):
+            cost  = {}
+            back  = {}
+            heap  = []
+            order = itertools.count()
+            for var in tab[n-index][index]:
+                heap.append((0, next(order), var, ("covers",)))
+            for length, var, rhs, pairs, c in self.splits(index):
+                for pair in pairs:
+                    heap.append((c, next(order), pair.var, ("split", pair, length)))
+            heapq.heapify(heap)
+            while heap:
+                c, _, var, how = heapq.heappop(heap)
+                if var in cost:
+                    continue
+                cost[var] = c
+                back[var] = how
+                for pairs in (cnf.pairtab[var] or {}).values():
+                    for pair in pairs:
+                        if pair.var not in cost and pair.rhs in lengths.length:
+                            heapq.heappush(heap, (c + lengths.length[pair.rhs], next(order), pair.var, ("left", pair)))
+                for lead in cnf.units.get(var, ()):
+                    if lead.var not in cost:
+                        heapq.heappush(heap, (c, next(order), lead.var, ("lead", lead)))
+            self.cost[index] = cost
+            self.back[index] = back
+
+    # pairs whose left symbol covers index..index+length inside the
+    # input, with the cost of their right symbol from there.
+    def splits(self, index):
+        tab     = self.table.tab
+        pairtab = self.table.cnf.pairtab
+        for length in tab.lengths(index):
+            after = self.cost[index+length]
+            for var in tab[length][index]:
+                for rhs, pairs in (pairtab[var] or {}).items():
+                    if rhs in after:
+                        yield length, var, rhs, pairs, after[rhs]
+
+    # the symbols to append for var at index, the way back points.
+    def missing(self, var, index, how=None):
+        out   = []
+        stack = [(var, index, how)]
+        while stack:
+            var, index, how = stack.pop()
+            if isinstance(var, list):
+                out.extend(var)
+                continue
+            if index == self.n:
+                out.extend(self.lengths.expand(var))
+                continue
+            how = how or self.back[index][var]
+            if how[0] == "split":
+                pair, length = how[1], how[2]
+                stack.append((pair.rhs, index+length, None))
+            elif how[0] == "left":
+                pair = how[1]
+                stack.append((self.lengths.expand(pair.rhs), None, None))
+                stack.append((pair.lhs, index, None))
+            elif how[0] == "lead":
+                stack.append((how[1].node, index, None))
+        return out
+
+    # every way var at index can run past the end, unit rules followed.
+    def ways(self, var, index):
+        cnf   = self.table.cnf
+        cost  = self.cost[index]
+        out   = []
+        seen  = set()
+        stack = [var]
+        while stack:
+            var = stack.pop()
+            if var in seen:
+                continue
+            seen.add(var)
+            if index == self.n:
+                if var in cost:
+                    out.append((cost[var], var, ("append",)))
+                continue
+            if var in self.table.tab[self.n-index][index]:
+                out.append((0, var, ("covers",)))
+            for length, lhs, rhs, pairs, c in self.splits(index):
+                for pair in pairs:
+                    if pair.var == var:
+                        out.append((c, var, ("split", pair, length)))
+            for pair in self.lengths.pairs.get(var, ()):
+                if pair.lhs in cost and pair.rhs in self.lengths.length:
+                    out.append((cost[pair.lhs] + self.lengths.length[pair.rhs], var, ("left", pair)))
+            for lead in self.lengths.leads.get(var, ()):
+                stack.append(lead.node)
+        return out
+
+def suggest(table, goals, k, lengths):
+    cnf = table.cnf
+    finish = Finish(table, lengths)
+    found  = []
+    seen   = set()
+    for goal in goals:
+        var = cnf.ids.get(goal)
+        if var is None:
+            continue
+        for cost, at, how in sorted(finish.ways(var, 0), key=lambda way: way[0]):
+            if how[0] == "append":
+                rule, missing = None, lengths.expand(at)
+            elif how[0] == "covers":
+                rule, missing = None, []
+            else:
+                rule, missing = how[1].rule, finish.missing(at, 0, how)
+            key = goal, tuple(map(repr, missing))
+            if key in seen:
+                continue
+            seen.add(key)
+            found.append(Completion(cost, goal, rule, missing))
+    found.sort(key=lambda completion: completion.cost)
+    return found[:k]
+
+# a way to finish the input: the symbols to append to it so that it
+# becomes the goal, rule is the rule the input stops in.
+class Completion:
+    def __init__(self, cost, goal, rule, missing):
+        self.cost    = cost
+        self.goal    = goal
+        self.rule    = rule
+        self.missing = missing
+
+    def __repr__(self):
+        return "Completion({0.cost}, {0.goal!r}, {0.rule}, {0.missing})".format(self)
@@ -1,80 +1,240 @@
+import threading
+from types import MappingProxyType
+
+# the cell of a span that produced nothing.
+EMPTY = MappingProxyType({})
+
+# held while a symbol is added to a cnf.
+interning = threading.Lock()
+
 # converts rules into chomsky normal form.
-# 
+# every symbol is interned into a dense integer id,
+# the tables and the cyk cells only ever see the ids.
 def cnf(rules, terminals):
-    leads = []
-    inits = []
-    pairs = []
-    specifiers = set()
-    implicits = {}
-    nonterminals = set()
-    def decompose(var, rule, sequence):
-        if len(sequence) <= 1:
-            rhs = sequence[0]
-            if var == rhs:
-                raise Exception("degenerate rule {}".format(rule))
-            if rhs in terminals:
-                inits.append(InitSym(rule.var, rule, rhs))
-            else:
-                leads.append(Lead(rule.var, rule, rhs))
-        elif len(sequence) == 2:
-            pairs.append(Pair(var, rule, *sequence))
-        else:
-            lhs, *rhs = sequence
-            rhs = tuple(rhs)
-            if rhs in implicits:
-                imp = implicits[rhs]
-            else:
-                imp = implicits[rhs] = Implicit(len(implicits))
-                decompose(imp, None, rhs)
-                pairs.append(Pair(var, rule, lhs, imp))
-    for rule in rules:
-        if rule.var in terminals:
-            raise Exception("{} is both a terminal and a nonterminal, remove the rules or the terminal of this name.".format(rule.var))
-        else:
-            nonterminals.add(rule.var)
-    for rule in rules:
-        for arg in rule:
-            if isinstance(arg, Specifier):
-                if arg not in implicits:
-                    specifiers.add(arg)
-                    implicits[arg] = arg
-                    inits.append(InitSpecifier(arg))
-                    arg.validate(terminals)
-            elif arg in nonterminals:
-                pass
-            elif arg in terminals:
-                pass
-            else:
-                raise Exception("{} of {} neither in terminals or nonterminals".format(arg, rule))
-        decompose(rule.var, rule, rule)
-
-    leadtab = dict((v, set()) for v in specifiers | nonterminals)
-
-    for lead in leads:
-        leadtab[lead.node].add(lead)
-    changed = True
-    while changed:
-        changed = False
-        for var, row in leadtab.items():
-            merge = set()
-            for lead in row:
-                merge |= leadtab[lead.var]
-            k = len(row)
-            row.update(merge)
-            changed |= len(row) > k
-
-    return CNF(leadtab, inits, pairs, terminals, nonterminals, specifiers)
+    out = CNF(set(), set(), set())
+    out.add(rules, terminals)
+    return out
 
 class CNF:
-    def __init__(self, leads, inits, pairs, terminals, nonterminals, specifiers):
-        self.leads = leads
-        self.inits = inits
-        self.pairs = pairs
+    def __init__(self, terminals, nonterminals, specifiers):
+        self.symbols  = [] # id -> symbol
+        self.ids      = {} # symbol -> id
+        self.implicit = [] # id -> whether the symbol is an Implicit
+        self.leads    = [] # id -> leads triggered by the symbol
+        self.pairtab  = [] # id -> {rhs id: pairs} of pairs with the symbol on the left
+        self.inits = []
+        self.pairs = []
         self.terminals    = terminals
         self.nonterminals = nonterminals
         self.specifiers   = specifiers
+        self.units     = {} # id -> unit rules with the symbol as their node
+        self.implicits = {} # rule suffix or specifier -> its symbol
+        self.initab    = {} # token attribute -> {value: inits that need it}
+        self.unindexed = [] # inits tried on every token
+
+    # token types outside the grammar still land in the table,
+    # so they get interned on the fly. Charts may be filled on several
+    # threads with one cnf, so a new symbol is added under a lock and
+    # its id is published last, once its rows are there.
+    def intern(self, sym):
+        num = self.ids.get(sym)
+        if num is None:
+            with interning:
+                num = self.ids.get(sym)
+                if num is None:
+                    num = len(self.symbols)
+                    self.symbols.append(sym)
+                    self.implicit.append(isinstance(sym, Implicit))
+                    self.leads.append(())
+                    self.pairtab.append(None)
+                    self.ids[sym] = num
+        return num
+
+    # the inits that may match the token, a dict lookup for each
+    # indexed attribute and then those that could not be indexed.
+    def candidates(self, token):
+        found = []
+        for field, table in self.initab.items():
+            inits = table.get(getattr(token, field))
+            if inits:
+                found.extend(inits)
+        found.extend(self.unindexed)
+        return found
+
+    # a copy that also knows the given rules and terminals.
+    # the ids stay as they were, so tables filled with this cnf stay
+    # readable, and only the leads of the symbols that reach a new
+    # unit rule are closed again.
+    def extend(self, rules, terminals):
+        out = CNF(set(self.terminals), set(self.nonterminals), set(self.specifiers))
+        out.symbols  = list(self.symbols)
+        out.ids      = dict(self.ids)
+        out.implicit = list(self.implicit)
+        out.leads    = list(self.leads)
+        out.pairtab  = list(self.pairtab)
+        out.inits = list(self.inits)
+        out.pairs = list(self.pairs)
+        out.units     = dict(self.units)
+        out.implicits = dict(self.implicits)
+        out.initab = dict((field, dict((value, list(inits)) for value, inits in table.items()))
+            for field, table in self.initab.items())
+        out.unindexed = list(self.unindexed)
+        out.add(rules, terminals)
+        return out
 
+    # the rows of pairtab and units are replaced, never changed in place,
+    # as copies made by extend() share them.
+    def add(self, rules, terminals):
+        intern = self.intern
+        implicits = self.implicits
+        first = len(self.inits)
+        units = []
+        pairs = []
+        def decompose(var, rule, sequence):
+            if len(sequence) <= 1:
+                rhs = sequence[0]
+                if var == rhs:
+                    raise Exception("degenerate rule {}".format(rule))
+                if rhs in self.terminals:
+                    self.inits.append(InitSym(intern(rule.var), rule, rhs))
+                else:
+                    units.append(Lead(intern(rule.var), rule, intern(rhs)))
+            elif len(sequence) == 2:
+                lhs, rhs = sequence
+                pairs.append(Pair(intern(var), rule, intern(lhs), intern(rhs)))
+            else:
+                lhs, *rhs = sequence
+                rhs = tuple(rhs)
+                if rhs in implicits:
+                    imp = implicits[rhs]
+                else:
+                    imp = implicits[rhs] = Implicit(len(implicits))
+                    decompose(imp, None, rhs)
+                pairs.append(Pair(intern(var), rule, intern(lhs), intern(imp)))
+        for term in terminals:
+            if term in self.nonterminals:
+                raise Exception("{} is both a terminal and a nonterminal, remove the rules or the terminal of this name.".format(term))
+            self.terminals.add(term)
+            intern(term)
+        for rule in rules:
+            if rule.var in self.terminals:
+                raise Exception("{} is both a terminal and a nonterminal, remove the rules or the terminal of this name.".format(rule.var))
+            else:
+                self.nonterminals.add(rule.var)
+                intern(rule.var)
+        for rule in rules:
+            for arg in rule:
+                if isinstance(arg, Specifier):
+                    if arg not in implicits:
+                        self.specifiers.add(arg)
+                        implicits[arg] = arg
+                        self.inits.append(InitSpecifier(intern(arg), arg))
+                        arg.validate(self.terminals)
+                elif arg in self.nonterminals:
+                    pass
+                elif arg in self.terminals:
+                    pass
+                else:
+                    raise Exception("{} of {} neither in terminals or nonterminals".format(arg, rule))
+            decompose(rule.var, rule, rule)
+
+        # pairs indexed by their left symbol, then by the right symbol,
+        # so the fill loop only visits pairs that can match a cell.
+        rows = {}
+        for pair in pairs:
+            row = rows.get(pair.lhs)
+            if row is None:
+                old = self.pairtab[pair.lhs] or {}
+                row = rows[pair.lhs] = dict((rhs, list(row)) for rhs, row in old.items())
+            row.setdefault(pair.rhs, []).append(pair)
+        for lhs, row in rows.items():
+            self.pairtab[lhs] = row
+        self.pairs.extend(pairs)
+
+        for init in self.inits[first:]:
+            key = init.index()
+            if key is None:
+                self.unindexed.append(init)
+            else:
+                field, value = key
+                self.initab.setdefault(field, {}).setdefault(value, []).append(init)
+
+        for lead in units:
+            self.units[lead.node] = self.units.get(lead.node, ()) + (lead,)
+        if units:
+            self.close(reaching(self.units, set(lead.node for lead in units)))
+
+    # leads[x] holds every unit rule reachable from x. Computed over the
+    # strongly connected components of the unit rules, that complete in
+    # reverse topological order, so each component takes the finished
+    # leads of the components below it. Symbols outside nodes keep theirs.
+    def close(self, nodes):
+        units = self.units
+        index = {}
+        low   = {}
+        stack = []
+        for root in nodes:
+            if root in index:
+                continue
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            work = [(root, iter(units.get(root, ())))]
+            while work:
+                v, it = work[-1]
+                for lead in it:
+                    w = lead.var
+                    if w not in nodes:
+                        continue
+                    if w not in index:
+                        index[w] = low[w] = len(index)
+                        stack.append(w)
+                        work.append((w, iter(units.get(w, ()))))
+                        break
+                    if w in low:
+                        low[v] = min(low[v], index[w])
+                else:
+                    work.pop()
+                    if work:
+                        u = work[-1][0]
+                        low[u] = min(low[u], low[v])
+                    if low[v] == index[v]:
+                        component = set()
+                        while True:
+                            w = stack.pop()
+                            component.add(w)
+                            if w == v:
+                                break
+                        row = {}
+                        for x in component:
+                            for lead in units.get(x, ()):
+                                row[lead] = None
+                                if lead.var not in component:
+                                    row.update(dict.fromkeys(self.leads[lead.var]))
+                        row = tuple(row)
+                        for x in component:
+                            self.leads[x] = row
+                            del low[x]
+
+# the symbols with a chain of unit rules to some of the targets.
+def reaching(units, targets):
+    parents = {}
+    for node, leads in units.items():
+        for lead in leads:
+            parents.setdefault(lead.var, []).append(node)
+    found = set(targets)
+    queue = list(targets)
+    while queue:
+        for node in parents.get(queue.pop(), ()):
+            if node not in found:
+                found.add(node)
+                queue.append(node)
+    return found
+
+# The pieces of the cnf, and everything else there are many of,
+# keep their fields in slots.
 class Lead:
+    __slots__ = ('var', 'rule', 'node')
+
     def __init__(self, var, rule, node):
         self.var  = var
         self.rule = rule
@@ -87,6 +247,8 @@ class Lead:
             return "{0.node} leads to {0.var} {{{0.rule}}}".format(self)
 
 class InitSym:
+    __slots__ = ('var', 'rule', 'terminal')
+
     def __init__(self, var, rule, terminal):
         self.var      = var
         self.rule     = rule
@@ -95,6 +257,9 @@ class InitSym:
     def match(self, token):
         return token.type == self.terminal
 
+    def index(self):
+        return "type", self.terminal
+
     def __repr__(self):
         if self.rule is None:
             return "{0.var} <- {0.terminal}".format(self)
@@ -102,17 +267,24 @@ class InitSym:
             return "{0.var} <- {0.terminal} {{{0.rule}}}".format(self)
 
 class InitSpecifier:
-    def __init__(self, specifier):
-        self.var       = specifier
+    __slots__ = ('var', 'specifier')
+
+    def __init__(self, var, specifier):
+        self.var       = var
         self.specifier = specifier
 
     def match(self, token):
         return self.specifier.match(token)
 
+    def index(self):
+        return self.specifier.index()
+
     def __repr__(self):
         return "initspec {0.specifier}".format(self)
 
 class Pair:
+    __slots__ = ('var', 'rule', 'lhs', 'rhs')
+
     def __init__(self, var, rule, lhs, rhs):
         self.var  = var
         self.rule = rule
@@ -126,6 +298,8 @@ class Pair:
             return "{0.var} <- {0.lhs} {0.rhs} {{{0.rule}}}".format(self)
 
 class Implicit:
+    __slots__ = ('num',)
+
     def __init__(self, num):
         self.num = num
 
@@ -136,45 +310,334 @@ class Implicit:
 # There's plenty of information about this algorithm,
 # The grammar is given in Chomsky normal form.
 # Produces every interpretation that is possible with the grammar.
-def cyk(tokens, cnf):
-    tab = [tokens] # cyk       table
-    apl = [None]   # structure table
-    for cols in range(len(tokens), 0, -1):
-        tab.append([{} for _ in range(cols)])
-        apl.append([[] for _ in range(cols)])
-    def increment(cell, key, count=1):
-        cell[key] = cell.get(key, 0) + count
-    for i, token in enumerate(tokens):
-        cell  = tab[1][i]
-        acell = apl[1][i]
-        increment(cell, token.type)
-        for init in cnf.inits:
-            if init.match(token):
-                increment(cell, init.var)
+# Without structure only the counts are filled and apl is None.
+# max_span fills only the spans up to that many tokens, the input is
+# then covered with a sequence of such spans.
+def cyk(tokens, cnf, structure=True, max_span=None):
+    tab, apl = chart(tokens, structure, max_span)
+    for length in range(1, tab.longest + 1):
+        for i in range(len(tokens) - length + 1):
+            fill(tab, apl, cnf, length, i)
+    return tab, apl, build_mintab(tab, cnf)
+
+def chart(tokens, structure=True, width=None):
+    tab = Chart(tokens, EMPTY, width)                     # cyk       table
+    apl = Chart(tokens, (), width) if structure else None # structure table
+    return tab, apl
+
+# A triangular table in one flat list, indexed by (length, i).
+# The cells are ordered by the end of their span, so appending a token
+# appends one block of cells. Empty cells all share one sentinel,
+# filled cells are dicts in tab and tuples in apl.
+# With a width only the spans up to width long are kept, a band of
+# width cells for every end, and the longer cells read as empty.
+class Chart:
+    def __init__(self, tokens, empty=EMPTY, width=None):
+        self.tokens = tokens
+        self.empty  = empty
+        self.width  = width
+        self.cells  = [empty] * self.size()
+
+    def size(self):
+        n = len(self.tokens)
+        if self.width is None:
+            return n*(n+1)//2
+        return n*self.width
+
+    # the length of the longest span that has a cell.
+    @property
+    def longest(self):
+        n = len(self.tokens)
+        if self.width is None:
+            return n
+        return min(n, self.width)
+
+    # the lengths of the cells that start at i.
+    def lengths(self, i):
+        return range(1, min(len(self.tokens) - i, self.longest) + 1)
+
+    def __len__(self):
+        return len(self.tokens) + 1
+
+    def __getitem__(self, length):
+        if length == 0:
+            return self.tokens
+        if not 0 < length <= len(self.tokens):
+            raise IndexError(length)
+        return Row(self, length)
+
+    def index(self, length, i):
+        end = i + length
+        if self.width is None:
+            return end*(end-1)//2 + length - 1
+        return (end-1)*self.width + length - 1
+
+    def cell(self, length, i):
+        if self.width is not None and length > self.width:
+            return self.empty
+        return self.cells[self.index(length, i)]
+
+    def lhs_cell(self, length, i, k):
+        return self.cell(*lhs_coords(length, i, k))
+
+    def rhs_cell(self, length, i, k):
+        return self.cell(*rhs_coords(length, i, k))
+
+    # adds the empty cells of tokens appended since.
+    def grow(self):
+        self.cells.extend([self.empty] * (self.size() - len(self.cells)))
+
+    def copy(self, tokens=None):
+        chart = Chart.__new__(Chart)
+        chart.tokens = self.tokens[:] if tokens is None else tokens
+        chart.empty  = self.empty
+        chart.width  = self.width
+        chart.cells  = self.cells[:]
+        return chart
+
+    # the (index, cell) of the filled cells.
+    def filled(self):
+        return ((index, cell) for index, cell in enumerate(self.cells) if cell)
+
+# A chart of the filled cells only, in a dict by (length, i), for the
+# engines that fill a few spans of a long input. Reads like a Chart,
+# the cells it does not hold are empty.
+class Sparse:
+    def __init__(self, tokens, empty=EMPTY):
+        self.tokens = tokens
+        self.empty  = empty
+        self.width  = None
+        self.cells  = {}
+        self.starts = {} # i -> lengths of the cells at i, built on demand
+        self.counted = 0
+
+    def spans(self):
+        if self.counted != len(self.cells):
+            starts = {}
+            for length, i in sorted(self.cells):
+                starts.setdefault(i, []).append(length)
+            self.starts  = starts
+            self.counted = len(self.cells)
+        return self.starts
+
+    @property
+    def longest(self):
+        return max((lengths[-1] for lengths in self.spans().values()), default=0)
+
+    def lengths(self, i):
+        return self.spans().get(i, ())
+
+    def __len__(self):
+        return len(self.tokens) + 1
+
+    def __getitem__(self, length):
+        if length == 0:
+            return self.tokens
+        if not 0 < length <= len(self.tokens):
+            raise IndexError(length)
+        return Row(self, length)
+
+    def index(self, length, i):
+        return length, i
+
+    def cell(self, length, i):
+        return self.cells.get((length, i), self.empty)
+
+    def lhs_cell(self, length, i, k):
+        return self.cell(*lhs_coords(length, i, k))
+
+    def rhs_cell(self, length, i, k):
+        return self.cell(*rhs_coords(length, i, k))
+
+    def copy(self, tokens=None):
+        chart = Sparse(self.tokens[:] if tokens is None else tokens, self.empty)
+        chart.cells = dict(self.cells)
+        return chart
+
+    def filled(self):
+        return iter(self.cells.items())
+
+class Row:
+    def __init__(self, chart, length):
+        self.chart  = chart
+        self.length = length
+
+    def __len__(self):
+        return len(self.chart.tokens) - self.length + 1
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.chart.cell(self.length, i)
+
+def increment(cell, key, count=1):
+    cell[key] = cell.get(key, 0) + count
+
+# fills the cell (length, i), and the structure of it unless apl is None.
+def fill(tab, apl, cnf, length, i):
+    cell  = {}
+    acell = [] if apl is not None else None
+    if length == 1:
+        fill_token(cnf, tab.tokens[i], cell, acell)
+    else:
+        fill_cell(tab, cnf, length, i, cell, acell)
+    if cell:
+        index = tab.index(length, i)
+        tab.cells[index] = cell
+        if acell:
+            apl.cells[index] = tuple(acell)
+
+# the init layer, fills a cell of length 1.
+def fill_token(cnf, token, cell, acell):
+    leads = cnf.leads
+    increment(cell, cnf.intern(token.type))
+    for init in cnf.candidates(token):
+        if init.match(token):
+            increment(cell, init.var)
+            for lead in leads[init.var]:
+                increment(cell, lead.var)
+            if acell is not None:
                 acell.append((init, 1))
-                for lead in cnf.leads.get(init.var, ()):
-                    increment(cell, lead.var)
+                for lead in leads[init.var]:
                     acell.append((lead, 1))
-    for length in range(2, len(tab)):
-        row  = tab[length]
-        arow = apl[length]
-        for i in range(len(tokens) - length + 1):
-            cell  = row[i]
-            acell = arow[i]
-            for k in range(1, length):
-                lcell = lhs_cell(tab, length, i, k)
-                rcell = rhs_cell(tab, length, i, k)
-                for pair in cnf.pairs:
-                    if pair.lhs in lcell and pair.rhs in rcell:
-                        lc = lcell[pair.lhs]
-                        rc = rcell[pair.rhs]
-                        increment(cell, pair.var, lc*rc)
-                        acell.append((pair, k))
-                        for lead in cnf.leads.get(pair.var, ()):
-                            increment(cell, lead.var)
-                            acell.append((lead, k))
-
-    return tab, apl, build_mintab(tab)
+
+# fills a cell of length >= 2 from the shorter cells,
+# splits limits the lengths of the left cells that are tried.
+def fill_cell(tab, cnf, length, i, cell, acell, splits=None):
+    pairtab = cnf.pairtab
+    cells   = tab.cells
+    width   = tab.width
+    # Chart.index spelled out, the right cells all end where this one ends.
+    end  = i + length
+    if width is None:
+        base = end*(end-1)//2 - 1
+    else:
+        base = (end-1)*width - 1
+    sparse = isinstance(tab, Sparse)
+    for k in splits or range(1, length):
+        if sparse:
+            lcell = cells.get((k, i), EMPTY)
+            rcell = cells.get((length-k, i+k), EMPTY)
+        elif width is None:
+            lcell = cells[(i+k)*(i+k-1)//2 + k - 1]
+            rcell = cells[base + length - k]
+        else:
+            lcell = cells[(i+k-1)*width + k - 1]
+            rcell = cells[base + length - k]
+        if not lcell or not rcell:
+            continue
+        for lhs, lc in lcell.items():
+            rtab = pairtab[lhs]
+            if rtab is None:
+                continue
+            # walk whichever side is smaller.
+            if len(rtab) < len(rcell):
+                for rhs, pairs in rtab.items():
+                    if rhs in rcell:
+                        apply(cnf, cell, acell, pairs, lc*rcell[rhs], k)
+            else:
+                for rhs, rc in rcell.items():
+                    if rhs in rtab:
+                        apply(cnf, cell, acell, rtab[rhs], lc*rc, k)
+
+def apply(cnf, cell, acell, pairs, count, k):
+    leads = cnf.leads
+    for pair in pairs:
+        increment(cell, pair.var, count)
+        for lead in leads[pair.var]:
+            increment(cell, lead.var)
+        if acell is not None:
+            acell.append((pair, k))
+            for lead in leads[pair.var]:
+                acell.append((lead, k))
+
+# Rebuilds the structure table one cell at a time, when it is asked for.
+# Stands in for apl when the table was filled without structure.
+class Structure:
+    def __init__(self, tab, cnf):
+        self.tab   = tab
+        self.cnf   = cnf
+        self.cells = {}
+
+    def __len__(self):
+        return len(self.tab)
+
+    def __getitem__(self, length):
+        if length == 0:
+            return None
+        return StructureRow(self, length)
+
+    def cell(self, length, i):
+        acell = self.cells.get((length, i))
+        if acell is None:
+            acell = self.cells[length, i] = derivations(self.tab, self.cnf, length, i)
+        return acell
+
+class StructureRow:
+    def __init__(self, structure, length):
+        self.structure = structure
+        self.length    = length
+
+    def __len__(self):
+        return len(self.structure.tab[self.length])
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.structure.cell(self.length, i)
+
+def derivations(tab, cnf, length, i):
+    acell = []
+    if length == 1:
+        fill_token(cnf, tab[0][i], {}, acell)
+    else:
+        fill_cell(tab, cnf, length, i, {}, acell)
+    return tuple(acell)
+
+# Reparses after an edit by reusing the cells of an earlier table.
+# Only the cells whose span touches the changed tokens get recomputed,
+# everything inside the unchanged prefix or suffix is shared.
+# old_apl is None if the old table was filled without structure.
+def recyk(old_tab, old_apl, tokens, cnf):
+    old = old_tab.tokens
+    n, m = len(old), len(tokens)
+    prefix = 0
+    while prefix < min(n, m) and same_token(old[prefix], tokens[prefix]):
+        prefix += 1
+    suffix = 0
+    while suffix < min(n, m) - prefix and same_token(old[n-1-suffix], tokens[m-1-suffix]):
+        suffix += 1
+    shift = m - n
+    tab, apl = chart(tokens, old_apl is not None, old_tab.width)
+    for length in range(1, tab.longest + 1):
+        for i in range(m - length + 1):
+            if i + length <= prefix:
+                j = i
+            elif i >= m - suffix:
+                j = i - shift
+            else:
+                fill(tab, apl, cnf, length, i)
+                continue
+            index = tab.index(length, i)
+            tab.cells[index] = old_tab.cell(length, j)
+            if apl is not None:
+                apl.cells[index] = old_apl.cell(length, j)
+    return tab, apl, build_mintab(tab, cnf)
+
+# Appends a token to the table and fills the new column,
+# the cells of every span that ends at the token.
+def extend(tab, apl, token, cnf):
+    tab.tokens.append(token)
+    tab.grow()
+    apl.grow()
+    n = len(tab.tokens)
+    for length in range(1, n+1):
+        fill(tab, apl, cnf, length, n - length)
+
+# tokens that can be told apart by the init layer.
+def same_token(a, b):
+    return (a.type == b.type and a.val == b.val
+        and a.near == b.near and a.length == b.length)
 
 # length, k - the length of the left-side.
 # this way the k and the length is the only thing needed to traverse the parsing result.
@@ -190,41 +653,61 @@ def lhs_coords(length, i, k):
 def rhs_coords(length, i, k):
     return length-k, i+k
 
-def count(tab):
+def count(tab, cnf):
     """
     Counts the available permutations of parse forests that cover the whole result.
     """
+    implicit = cnf.implicit
     n     = len(tab[0])
     count = [1] * (n+1)
     for i in range(n-1, -1, -1):
         score = 0
-        for length in range(1, 1+n-i):
+        for length in tab.lengths(i):
             if tab[length][i]:
                 mult = count[i+length]
                 for var in tab[length][i]:
-                    if not isinstance(var, Implicit):
+                    if not implicit[var]:
                         score += mult
         count[i] = score
     return count[0]
 
-def build_mintab(tab):
+# the results that cover the tokens from i on, counted for every i
+# by their number of pieces, for picking a result by its rank.
+def counts(tab, cnf):
+    implicit = cnf.implicit
+    n   = len(tab[0])
+    out = [None] * (n+1)
+    out[n] = [1]
+    for i in range(n-1, -1, -1):
+        row = [0] * (n-i+1)
+        for length in tab.lengths(i):
+            mult = sum(1 for var in tab[length][i] if not implicit[var])
+            if mult:
+                for size, count in enumerate(out[i+length]):
+                    if count:
+                        row[size+1] += mult * count
+        out[i] = row
+    return out
+
+def build_mintab(tab, cnf):
     """
     Calculates a map to produce the most concise match first.
     Reveals the shortest match too.
     """
+    implicit = cnf.implicit
     n   = len(tab[0])
     nom = n+1
     shortest = [nom] * (n+1)
     mintab   = [shortest]
-    for cols in range(n, 0, -1):
+    for cols in range(n, n - tab.longest, -1):
         mintab.append([nom for _ in range(cols)])
     shortest[n]  = 0
     for i in range(n-1, -1, -1):
         score = nom
-        for length in range(1, 1+n-i):
+        for length in tab.lengths(i):
             solution = False
             for var in tab[length][i]:
-                if not isinstance(var, Implicit):
+                if not implicit[var]:
                     solution = True
                     break
             if solution:
@@ -235,5 +718,15 @@ def build_mintab(tab):
     return mintab
 
 # Specifiers extend the capabilities of the engine.
+# index() may return (attribute, value) when match() only succeeds
+# on tokens with that value, so the specifier is looked up by the
+# value rather than tried on every token.
+# key() may return a tuple of the fields that tell the specifier apart
+# from the others of its type, the compile cache keys it by them and
+# does not cache a grammar with a specifier that has no key.
 class Specifier:
-    pass
+    def index(self):
+        return None
+
+    def key(self):
+        return None
@@ -0,0 +1,189 @@
+# Parses a long token list a segment at a time.
+# A chart over the whole document grows with the square of its length
+# even when every statement fits on a line, so the tokens are split at
+# boundaries and each segment gets a chart of its own. A segment that
+# does not parse as a goal is joined with the segments after it, one
+# at a time, until the joined tokens parse or join segments were tried.
+import multiprocessing, os
+from . import cyk
+
+# boundary is "line" to split where the line of the tokens changes,
+# a collection of token values that end a segment, like {";"},
+# or a function (token, next) that tells whether to split between them.
+# Gives (start, tokens) of the segments, on lines the newline tokens
+# are left out of them. The segments are slices of tokens, so those of
+# a TokenBuffer are TokenBuffers.
+def split(tokens, boundary="line"):
+    skip = lambda token: False
+    if boundary == "line":
+        cut  = lambda token, next: token.pos // 1000 != next.pos // 1000
+        skip = lambda token: token.val == "\n"
+    elif callable(boundary):
+        cut = boundary
+    else:
+        values = frozenset(boundary)
+        cut = lambda token, next: token.val in values
+    spans = []
+    start = last = None
+    for index, token in enumerate(tokens):
+        if skip(token):
+            if start is not None:
+                spans.append((start, index))
+                start = None
+            continue
+        if start is not None and cut(last, token):
+            spans.append((start, index))
+            start = None
+        if start is None:
+            start = index
+        last = token
+    if start is not None:
+        spans.append((start, len(tokens)))
+    return [(start, tokens[start:stop]) for start, stop in spans]
+
+def parse(grammar, tokens, goals, boundary="line", workers=None, engine="cyk", join=8):
+    from . import TokenBuffer
+    if not isinstance(tokens, TokenBuffer):
+        tokens = list(tokens)
+    segments = split(tokens, boundary)
+    tables   = parse_segments(grammar, [segment for _, segment in segments], workers, engine)
+    out = []
+    i = 0
+    while i < len(segments):
+        table = tables[i]
+        stop  = i + 1
+        goal  = reaches(table, goals)
+        if goal is None:
+            table, stop = joined(grammar, segments, i, join, goals) or (table, stop)
+            goal = reaches(table, goals)
+        out.append(Segment(segments[i][0], table, goal))
+        i = stop
+    return Document(grammar, out)
+
+# the tables of the segments, filled on a process pool if workers is
+# not None. The workers fill only the counts, the structure is then
+# rebuilt on demand from the cnf of this process.
+def parse_segments(grammar, segments, workers, engine):
+    if workers is None or len(segments) < 2:
+        return [grammar.parse(segment, engine) for segment in segments]
+    from . import Table
+    cnf = grammar.cnf
+    # the token types are interned here before the cnf is copied to the
+    # workers, so the ids they send back are those of this process.
+    for segment in segments:
+        for token in segment:
+            cnf.intern(token.type)
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(segments) // (workers * 4))
+    with multiprocessing.Pool(workers, start, (cnf, engine)) as pool:
+        filled = pool.map(fill, segments, chunksize)
+    tables = []
+    for segment, (cells, mintab) in zip(segments, filled):
+        tab = cyk.Sparse(segment) if engine == "earley" else cyk.Chart(segment)
+        for index, cell in cells:
+            tab.cells[index] = cell
+        tables.append(Table(grammar, tab, None, mintab, cnf, complete=engine != "earley"))
+    return tables
+
+job = None
+
+def start(cnf, engine):
+    global job
+    job = cnf, engine
+
+# the filled cells go back without the chart, the tokens are known.
+def fill(tokens):
+    from . import recognizer
+    cnf, engine = job
+    tab, _, mintab = recognizer(engine)(tokens, cnf, False)
+    return list(tab.filled()), mintab
+
+# joins the segments from i on until they parse as a goal, the chart
+# is extended a segment at a time so no tokens are filled twice.
+def joined(grammar, segments, i, join, goals):
+    from . import Parser
+    parser = Parser(grammar)
+    parser.extend(segments[i][1])
+    for stop in range(i+1, min(len(segments), i+join)):
+        parser.extend(segments[stop][1])
+        table = parser.table
+        if reaches(table, goals) is not None:
+            return table, stop+1
+    return None
+
+# the goal that covers the whole table, None if there is none.
+def reaches(table, goals):
+    n = len(table.tab[0])
+    if n == 0:
+        return None
+    symbols = table.cnf.symbols
+    for var in table.tab[n][0]:
+        if symbols[var] in goals:
+            return symbols[var]
+    return None
+
+# start is the index of the first token of the segment in the document.
+# goal is the goal symbol that covers it, None when it failed.
+class Segment:
+    def __init__(self, start, table, goal):
+        self.start = start
+        self.table = table
+        self.goal  = goal
+
+    @property
+    def tokens(self):
+        return self.table.tab.tokens
+
+    @property
+    def success(self):
+        return self.goal is not None
+
+    # the unambiguous result of the goal, None if there is no such.
+    @property
+    def result(self):
+        if self.goal is None:
+            return None
+        for result in self.table.just(1):
+            if result[0] == self.goal and result.ambiguity == 1:
+                return result
+        return None
+
+    def __repr__(self):
+        return "Segment({0.start}, {1}, {0.goal!r})".format(self, len(self.tokens))
+
+# the segments of a document in order.
+class Document:
+    def __init__(self, grammar, segments):
+        self.grammar  = grammar
+        self.segments = segments
+
+    @property
+    def success(self):
+        return all(segment.success for segment in self.segments)
+
+    @property
+    def failures(self):
+        return [segment for segment in self.segments if not segment.success]
+
+    @property
+    def shortest(self):
+        return sum(segment.table.shortest for segment in self.segments)
+
+    # the traversals of the segments that have an unambiguous result,
+    # in document order.
+    def traverse(self, visitor=None, *args):
+        outputs = []
+        for segment in self.segments:
+            result = segment.result
+            if result is not None:
+                outputs.append(result.traverse(visitor, *args))
+        return outputs
+
+    def __iter__(self):
+        return iter(self.segments)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __getitem__(self, index):
+        return self.segments[index]
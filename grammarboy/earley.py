@@ -0,0 +1,232 @@
+# An Earley parser over the rules themselves.
+# CYK fills every span of the input with every symbol that derives it,
+# here a symbol is only looked for where a rule predicts it, so on an
+# input the grammar reads nearly deterministically the work grows with
+# the input rather than with its cube.
+# The spans that the parse completes are then filled into a chart with
+# the same cnf pieces that cyk.fill uses, so the Table works as usual:
+# just(), traverse(), explain() and the diagnostics all read it alike.
+# The chart and mintab hold only those spans, so they grow with the
+# input too.
+#
+# The goals are predicted at the start of the input, and again at
+# every token that nothing being parsed can continue with, so an input
+# that fails still splits into pieces. Without goals every nonterminal
+# of the grammar is a goal.
+import weakref
+from . import cyk
+
+# Items are single ints, a dotted rule and the origin of the item:
+# item = dotted + origin * size. The dotted rules of a rule are numbered
+# in a row, so moving the dot over a symbol is item + 1.
+class Dotted:
+    def __init__(self, cnf):
+        rules = {}
+        for pair in cnf.pairs:
+            if pair.rule is not None:
+                rules[pair.rule] = None
+        for init in cnf.inits:
+            if isinstance(init, cyk.InitSym):
+                rules[init.rule] = None
+        for units in cnf.units.values():
+            for lead in units:
+                rules[lead.rule] = None
+        self.rules   = list(rules)
+        self.next    = [] # dotted -> symbol after the dot, None at the end
+        self.dot     = [] # dotted -> symbols before the dot
+        self.var     = [] # dotted -> cnf id of the rule's nonterminal
+        self.lhs     = [] # dotted -> the rule's nonterminal
+        self.suffix  = [] # dotted -> cnf id of the rule from the dot on
+        self.predict = {} # nonterminal -> first dotted of its rules
+        for rule in self.rules:
+            self.predict.setdefault(rule.var, []).append(len(self.next))
+            var = cnf.ids[rule.var]
+            for dot in range(len(rule) + 1):
+                self.next.append(rule[dot] if dot < len(rule) else None)
+                self.dot.append(dot)
+                self.var.append(var)
+                self.lhs.append(rule.var)
+                if dot == 0:
+                    self.suffix.append(var)
+                elif len(rule) - dot >= 2:
+                    self.suffix.append(cnf.ids[cnf.implicits[tuple(rule[dot:])]])
+                else:
+                    self.suffix.append(None)
+        self.size = len(self.next)
+
+_dotted = weakref.WeakKeyDictionary()
+
+def dotted(cnf):
+    table = _dotted.get(cnf)
+    if table is None:
+        table = _dotted[cnf] = Dotted(cnf)
+    return table
+
+def earley(tokens, cnf, structure=True, goals=None):
+    grammar = dotted(cnf)
+    n = len(tokens)
+    spans = recognize(grammar, tokens, cnf, goals)
+    # a long input fills few of its spans, the chart holds only those.
+    tab = cyk.Sparse(tokens)
+    apl = cyk.Sparse(tokens, ()) if structure else None
+    for i in range(n):
+        cyk.fill(tab, apl, cnf, 1, i)
+    found, splits = spans
+    starts = [[1] for _ in range(n)]
+    implicit = cnf.implicit
+    for (i, j) in sorted(splits, key=lambda span: span[1] - span[0]):
+        length = j - i
+        keep   = found[i, j]
+        cell  = {}
+        acell = [] if apl is not None else None
+        cyk.fill_cell(tab, cnf, length, i, cell, acell, sorted(splits[i, j]))
+        # pieces of symbols that were not predicted here are dropped,
+        # their counts could miss the splits that were not tried.
+        cell = dict((var, count) for var, count in cell.items() if var in keep)
+        if not cell:
+            continue
+        index = tab.index(length, i)
+        tab.cells[index] = cell
+        if acell:
+            apl.cells[index] = tuple(piece for piece in acell if piece[0].var in keep)
+        if not all(implicit[var] for var in cell):
+            starts[i].append(length)
+    return tab, apl, mintab(n, starts)
+
+# runs the parse, returns the symbols completed over every span and
+# the splits of the binarized rules over them, keyed by (start, stop).
+def recognize(grammar, tokens, cnf, goals):
+    size    = grammar.size
+    nexts   = grammar.next
+    lhs     = grammar.lhs
+    predict = grammar.predict
+    if goals is None:
+        goals = list(predict)
+    n = len(tokens)
+    waiting = [None] * (n+1) # position -> {symbol: items with it after the dot}
+    links   = [None] * (n+1) # position -> {item: positions it advanced from}
+    done    = []             # (dotted, origin, stop) of the completed items
+    links[0] = {}
+    scanned  = []
+    for p in range(n+1):
+        wait     = waiting[p] = {}
+        finished = set()
+        predicted = set()
+        agenda = list(scanned)
+        seen   = set(agenda)
+        if p < n:
+            token   = tokens[p]
+            matched = [token.type]
+            for init in cnf.candidates(token):
+                if isinstance(init, cyk.InitSpecifier) and init.match(token):
+                    matched.append(init.specifier)
+        else:
+            matched = []
+        restart = p == 0
+        while True:
+            if restart:
+                for goal in goals:
+                    if goal in predict and goal not in predicted:
+                        predicted.add(goal)
+                        for first in predict[goal]:
+                            item = first + p*size
+                            if item not in seen:
+                                seen.add(item)
+                                agenda.append(item)
+            while agenda:
+                item = agenda.pop()
+                at   = item % size
+                sym  = nexts[at]
+                if sym is None:
+                    origin = item // size
+                    done.append((at, origin, p))
+                    key = lhs[at], origin
+                    if key in finished:
+                        continue
+                    finished.add(key)
+                    step = links[p]
+                    for wait_item in waiting[origin].get(lhs[at], ()):
+                        new = wait_item + 1
+                        step.setdefault(new, []).append(origin)
+                        if new not in seen:
+                            seen.add(new)
+                            agenda.append(new)
+                else:
+                    wait.setdefault(sym, []).append(item)
+                    if sym in predict and sym not in predicted:
+                        predicted.add(sym)
+                        for first in predict[sym]:
+                            new = first + p*size
+                            if new not in seen:
+                                seen.add(new)
+                                agenda.append(new)
+            if restart or p == n or any(sym in wait for sym in matched):
+                break
+            restart = True
+        if p < n:
+            step = links[p+1] = {}
+            scanned = []
+            for sym in matched:
+                for item in wait.get(sym, ()):
+                    new = item + 1
+                    if new not in step:
+                        scanned.append(new)
+                    step.setdefault(new, []).append(p)
+    return spans(grammar, done, links)
+
+# walks the completed items back to the start of their rules, every
+# suffix of two or more symbols is a pair in the chart over the span
+# from where the suffix starts to where the rule stops.
+def spans(grammar, done, links):
+    size   = grammar.size
+    dots   = grammar.dot
+    suffix = grammar.suffix
+    var    = grammar.var
+    found  = {}
+    splits = {}
+    for at, origin, stop in done:
+        found.setdefault((origin, stop), set()).add(var[at])
+        if dots[at] < 2:
+            continue
+        length = dots[at]
+        stack = [(at, stop)]
+        seen  = set(stack)
+        while stack:
+            cur, q = stack.pop()
+            d = dots[cur]
+            for p in links[q][cur + origin*size]:
+                if length - d + 1 >= 2:
+                    found.setdefault((p, stop), set()).add(suffix[cur-1])
+                    splits.setdefault((p, stop), set()).add(q - p)
+                if d >= 2 and (cur-1, p) not in seen:
+                    seen.add((cur-1, p))
+                    stack.append((cur-1, p))
+    return found, splits
+
+# build_mintab over the filled spans only, starts[i] holds the lengths
+# of the cells at i that have a symbol other than an implicit one.
+# The rows hold only those spans too.
+def mintab(n, starts):
+    nom = n+1
+    shortest = [nom] * (n+1)
+    longest  = max((max(lengths) for lengths in starts), default=0)
+    table    = [shortest] + [Row(nom) for _ in range(longest)]
+    shortest[n] = 0
+    for i in range(n-1, -1, -1):
+        score = nom
+        for length in starts[i]:
+            s = shortest[i+length] + 1
+            table[length][i] = s
+            score = min(score, s)
+        shortest[i] = score
+    return table
+
+# a row of mintab, the spans it does not hold cover nothing.
+class Row(dict):
+    __slots__ = ('missing',)
+
+    def __init__(self, missing):
+        self.missing = missing
+
+    def __missing__(self, i):
+        return self.missing
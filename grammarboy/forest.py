@@ -0,0 +1,109 @@
+# A shared packed parse forest over a parsed table.
+# There is one node for every (symbol, index, length) that the table
+# holds, and each node lists its derivations once, as packed
+# alternatives that point to the nodes of their parts. The nodes are
+# made as they are visited, so the forest never grows larger than the
+# chart, however many parses share the nodes.
+from . import cyk
+
+class Forest:
+    def __init__(self, table):
+        self.table = table
+        self.cnf   = table.cnf
+        self.nodes = {} # (var, index, length) -> Node
+        self.cells = {} # (length, index) -> {var: alternatives}
+
+    # the node of a grammar symbol, None if the table does not have it.
+    def node(self, symbol, index, length):
+        var = self.cnf.ids.get(symbol)
+        if var is None or var not in self.table.tab[length][index]:
+            return None
+        return self.get(var, index, length)
+
+    def get(self, var, index, length):
+        key = var, index, length
+        node = self.nodes.get(key)
+        if node is None:
+            node = self.nodes[key] = Node(self, var, index, length)
+        return node
+
+    # the nodes of the pieces of a result.
+    def cover(self, trees):
+        nodes = []
+        index = 0
+        for symbol, length, _ in trees:
+            nodes.append(self.node(symbol, index, length))
+            index += length
+        return nodes
+
+    # the alternatives of every symbol of a cell, in the order of the
+    # structure table. A lead shows up there once for every split of
+    # the pair that triggered it, here it is one alternative.
+    def derivations(self, length, index):
+        cell = self.cells.get((length, index))
+        if cell is not None:
+            return cell
+        cell  = {}
+        leads = set()
+        for obj, k in self.table.apl[length][index]:
+            if isinstance(obj, cyk.Lead):
+                if obj in leads:
+                    continue
+                leads.add(obj)
+                packed = Packed(obj.rule, None, (self.get(obj.node, index, length),))
+            elif isinstance(obj, cyk.InitSym):
+                packed = Packed(obj.rule, None, (self.table.tab[0][index],))
+            elif isinstance(obj, cyk.Pair):
+                left  = self.get(obj.lhs, index, k)
+                right = self.get(obj.rhs, index+k, length-k)
+                packed = Packed(obj.rule, k, (left, right))
+            else:
+                continue
+            cell.setdefault(obj.var, []).append(packed)
+        self.cells[length, index] = cell
+        return cell
+
+class Node:
+    __slots__ = ('forest', 'var', 'index', 'length')
+
+    def __init__(self, forest, var, index, length):
+        self.forest = forest
+        self.var    = var
+        self.index  = index
+        self.length = length
+
+    @property
+    def symbol(self):
+        return self.forest.cnf.symbols[self.var]
+
+    # binarized rule suffixes, their alternatives hold the rest of a rule.
+    @property
+    def implicit(self):
+        return self.forest.cnf.implicit[self.var]
+
+    @property
+    def alternatives(self):
+        return self.forest.derivations(self.length, self.index).get(self.var, [])
+
+    # terminals and specifiers stand for their token.
+    @property
+    def token(self):
+        if self.length == 1 and not self.alternatives:
+            return self.forest.table.tab[0][self.index]
+        return None
+
+    def __repr__(self):
+        return "{0.symbol}:{0.index}:{0.length}".format(self)
+
+# one derivation of a node, children are nodes and tokens.
+# middle is the split of a pair, None for the rules of one symbol.
+class Packed:
+    __slots__ = ('rule', 'middle', 'children')
+
+    def __init__(self, rule, middle, children):
+        self.rule     = rule
+        self.middle   = middle
+        self.children = children
+
+    def __repr__(self):
+        return "{0.rule}:{0.middle}:{0.children}".format(self)
@@ -0,0 +1,155 @@
+# Statistics of a parse, for finding where the time goes.
+# Grammar.parse(..., stats=True) comes here: the phases are timed as
+# they run, then the finished chart is walked once more to count what
+# the fill did. The counts of the fill are those of the serial cyk
+# engine, the other engines leave them None.
+# A parse without stats never touches this module.
+import sys, time
+from . import cyk
+
+# called with the Stats of every instrumented parse,
+# append a function here to forward them to a metrics system.
+hooks = []
+
+class Stats:
+    def __init__(self):
+        self.phases = {}        # phase -> seconds
+        self.tokens = 0
+        self.init_checks = None # inits tried on a token
+        self.init_hits   = None
+        self.pair_checks = None # symbol lookups in the pair loop
+        self.pair_hits   = None # (pair, split) that produced something
+        self.lead_expansions = None
+        self.apl_entries = None # entries of the full structure table
+        self.occupied = {}      # span length -> occupied cells
+        self.symbols  = {}      # symbols in a cell -> cells
+        self.memory   = 0       # bytes in the tables, estimated
+        self.results  = 0       # results enumerated so far
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def phase(self, name):
+        return Phase(self, name)
+
+    # times the time spent inside an iterator.
+    def timed(self, name, iterator):
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start)
+                return
+            self.add(name, time.perf_counter() - start)
+            self.results += 1
+            yield item
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+    def __repr__(self):
+        phases = " ".join("{}={:.4f}s".format(name, took) for name, took in self.phases.items())
+        return "<Stats {} pair_checks={} pair_hits={} leads={} apl={} memory={}>".format(
+            phases, self.pair_checks, self.pair_hits, self.lead_expansions, self.apl_entries, self.memory)
+
+class Phase:
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name  = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.stats.add(self.name, time.perf_counter() - self.start)
+
+def parse(grammar, tokens, engine, structure, workers, goals=None, max_span=None):
+    from . import Table, recognizer
+    stats = Stats()
+    stats.tokens = n = len(tokens)
+    with stats.phase("cnf"):
+        cnf = grammar.cnf
+    # the serial engine is run here a layer at a time to time the layers.
+    serial = engine == "cyk" and workers is None and goals is None
+    if serial:
+        with stats.phase("chart"):
+            tab, apl = cyk.chart(tokens, structure, max_span)
+        with stats.phase("init"):
+            for i in range(n):
+                cyk.fill(tab, apl, cnf, 1, i)
+        with stats.phase("pairs"):
+            for length in range(2, tab.longest + 1):
+                for i in range(n - length + 1):
+                    cyk.fill(tab, apl, cnf, length, i)
+        with stats.phase("mintab"):
+            mintab = cyk.build_mintab(tab, cnf)
+    else:
+        with stats.phase("fill"):
+            tab, apl, mintab = recognizer(engine, workers, goals, max_span)(tokens, cnf, structure)
+    with stats.phase("stats"):
+        if serial:
+            walk(stats, tab, cnf)
+        elif apl is not None and not isinstance(apl, cyk.Structure):
+            stats.apl_entries = sum(len(acell) for _, acell in apl.filled())
+        occupancy(stats, tab)
+        stats.memory = memory(tab, apl)
+    for hook in hooks:
+        hook(stats)
+    return Table(grammar, tab, apl, mintab, cnf, stats, engine != "earley")
+
+# counts what cyk.fill_token and cyk.fill_cell did, their cells depend
+# only on shorter cells, that the finished chart still holds.
+# The other engines fill the chart their own way, this says nothing of them.
+def walk(stats, tab, cnf):
+    leads   = cnf.leads
+    pairtab = cnf.pairtab
+    n = len(tab.tokens)
+    stats.init_checks = stats.init_hits = 0
+    stats.pair_checks = stats.pair_hits = stats.lead_expansions = 0
+    for token in tab.tokens:
+        for init in cnf.candidates(token):
+            stats.init_checks += 1
+            if init.match(token):
+                stats.init_hits += 1
+                stats.lead_expansions += len(leads[init.var])
+    for length in range(2, tab.longest + 1):
+        for i in range(n - length + 1):
+            for k in range(1, length):
+                lcell = tab.cell(k, i)
+                rcell = tab.cell(length-k, i+k)
+                if not lcell or not rcell:
+                    continue
+                for lhs in lcell:
+                    rtab = pairtab[lhs]
+                    if rtab is None:
+                        continue
+                    if len(rtab) < len(rcell):
+                        stats.pair_checks += len(rtab)
+                        hits = [rhs for rhs in rtab if rhs in rcell]
+                    else:
+                        stats.pair_checks += len(rcell)
+                        hits = [rhs for rhs in rcell if rhs in rtab]
+                    for rhs in hits:
+                        for pair in rtab[rhs]:
+                            stats.pair_hits += 1
+                            stats.lead_expansions += len(leads[pair.var])
+    stats.apl_entries = stats.init_hits + stats.pair_hits + stats.lead_expansions
+
+def occupancy(stats, tab):
+    for i in range(len(tab.tokens)):
+        for length in tab.lengths(i):
+            cell = tab.cell(length, i)
+            if cell:
+                stats.occupied[length] = stats.occupied.get(length, 0) + 1
+                stats.symbols[len(cell)] = stats.symbols.get(len(cell), 0) + 1
+    stats.occupied = dict(sorted(stats.occupied.items()))
+    stats.symbols  = dict(sorted(stats.symbols.items()))
+
+# the bytes of the containers of the counts and the structure,
+# the ints and the shared objects they point at are left out.
+def memory(tab, apl):
+    size = sys.getsizeof(tab.cells) + sum(sys.getsizeof(cell) for _, cell in tab.filled())
+    if apl is not None and not isinstance(apl, cyk.Structure):
+        size += sys.getsizeof(apl.cells) + sum(sys.getsizeof(acell) for _, acell in apl.filled())
+    return size
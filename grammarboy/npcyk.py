@@ -0,0 +1,121 @@
+# The CYK algorithm vectorized with numpy.
+# Every span length is a (position, symbol) array of counts, and a span
+# length is filled for every start position and every pair at once,
+# a chunk of split points at a time: the left cells (k, i) are the
+# rows of length k and the right cells (length-k, i+k) are the rows of
+# length-k shifted by k.
+# Only the symbols that appear in some pair are kept in the rows, the
+# others are read from the chart alone.
+# Produces the same tab and apl as cyk.cyk. The counts are int64 until
+# a length could overflow them, from there on they are Python ints.
+import numpy
+from .cyk import chart, fill, build_mintab
+
+def cyk(tokens, cnf, structure=True, budget=1<<20):
+    tab, apl = chart(tokens, structure)
+    n = len(tokens)
+    for i in range(n):
+        fill(tab, apl, cnf, 1, i)
+    size  = len(cnf.symbols)
+    pairs = cnf.pairs
+    # the pairs sorted by their symbol, so the counts of a symbol
+    # are summed from one run of columns.
+    order = sorted(range(len(pairs)), key=lambda p: pairs[p].var)
+    used  = sorted(set(pair.lhs for pair in pairs) | set(pair.rhs for pair in pairs))
+    column = dict((var, c) for c, var in enumerate(used))
+    lhs  = numpy.array([column[pairs[p].lhs] for p in order], dtype=numpy.intp)
+    rhs  = numpy.array([column[pairs[p].rhs] for p in order], dtype=numpy.intp)
+    perm = numpy.array(order, dtype=numpy.intp)
+    heads = []
+    runs  = []
+    for at, p in enumerate(order):
+        if not heads or heads[-1] != pairs[p].var:
+            heads.append(pairs[p].var)
+            runs.append(at)
+    runs = numpy.array(runs, dtype=numpy.intp)
+    leads = sum(len(cnf.leads[var]) for var in heads)
+
+    dtype = numpy.int64
+    rows  = [None] * (n+1) # length -> (position, used symbol) counts
+    live  = [None] * (n+1) # length -> used symbol -> whether it is in some cell
+    largest = 0
+    if n:
+        rows[1] = numpy.zeros((n, len(used)), dtype=dtype)
+        for i, cell in enumerate(tab[1]):
+            for var, count in cell.items():
+                if var in column:
+                    rows[1][i, column[var]] = count
+                largest = max(largest, count)
+        live[1] = rows[1].any(0)
+
+    for length in range(2, n+1):
+        # a count sums at most one product per split and pair,
+        # and a lead adds at most one for each of them.
+        if dtype is not object and (length-1) * len(pairs) * (largest*largest + leads) >= 2**63:
+            dtype = object
+            rows  = [row if row is None else row.astype(object) for row in rows]
+        cols  = n - length + 1
+        prods = numpy.zeros((cols, len(pairs)), dtype=dtype)
+        hits  = numpy.zeros((cols, len(pairs)), dtype=numpy.int64)
+        found = []
+        # the split points go in chunks of at most budget counts,
+        # and a chunk reads only the pairs that have both sides in it.
+        step = max(1, budget // (cols * max(len(used), 1)))
+        for k0 in range(1, length if len(pairs) else 1, step):
+            ks = range(k0, min(length, k0+step))
+            active = numpy.flatnonzero(
+                numpy.stack([live[k] for k in ks]).any(0)[lhs] &
+                numpy.stack([live[length-k] for k in ks]).any(0)[rhs])
+            if not len(active):
+                continue
+            left  = gather([rows[k][:cols] for k in ks], lhs[active])
+            right = gather([rows[length-k][k:k+cols] for k in ks], rhs[active])
+            prod  = left * right
+            hit   = prod != 0
+            if not hit.any():
+                continue
+            prods[:, active] += prod.sum(0)
+            hits[:, active]  += hit.sum(0)
+            if apl:
+                at, cs, ps = numpy.nonzero(hit)
+                found.append((at + k0, cs, perm[active[ps]]))
+        if len(pairs):
+            counts = numpy.add.reduceat(prods, runs, axis=1)
+            splits = numpy.add.reduceat(hits, runs, axis=1)
+        row = numpy.zeros((cols, size), dtype=dtype)
+        if len(pairs):
+            row[:, heads] = counts
+            for h, var in enumerate(heads):
+                for lead in cnf.leads[var]:
+                    row[:, lead.var] += splits[:, h]
+        rows[length] = row[:, used]
+        live[length] = rows[length].any(0)
+        if found:
+            # the structure table lists the splits by k, then by pair.
+            ks, cs, ps = (numpy.concatenate(a) for a in zip(*found))
+            index = numpy.lexsort((ps, ks))
+            acells = {}
+            for k, i, p in zip(ks[index].tolist(), cs[index].tolist(), ps[index].tolist()):
+                pair  = pairs[p]
+                acell = acells.setdefault(i, [])
+                acell.append((pair, k))
+                for lead in cnf.leads[pair.var]:
+                    acell.append((lead, k))
+            for i, acell in acells.items():
+                apl.cells[apl.index(length, i)] = tuple(acell)
+        cells = {}
+        for i, var in zip(*(a.tolist() for a in numpy.nonzero(row))):
+            count = int(row[i, var])
+            cells.setdefault(i, {})[var] = count
+            largest = max(largest, count)
+        for i, cell in cells.items():
+            tab.cells[tab.index(length, i)] = cell
+    return tab, apl, build_mintab(tab, cnf)
+
+# the columns of the stacked rows, when only a few of them are needed
+# they are picked before stacking.
+def gather(rows, columns):
+    if 4*len(columns) >= rows[0].shape[1]:
+        return numpy.stack(rows)[:, :, columns]
+    picked, inverse = numpy.unique(columns, return_inverse=True)
+    return numpy.stack([row[:, picked] for row in rows])[:, :, inverse]
@@ -0,0 +1,162 @@
+# Parsing on several processes at once.
+#
+# Fills the chart on several processes at once.
+# The cells of one span length depend only on the shorter spans, so each
+# length is split into chunks of start positions that the workers fill
+# side by side. Every worker keeps its own replica of the counts, and a
+# finished row is pickled once and sent to each worker once, rather
+# than shipping the shorter rows again for every length.
+import multiprocessing, os, pickle
+from . import cyk as _cyk, document
+
+def cyk(tokens, cnf, structure=True, workers=None):
+    workers = workers or os.cpu_count() or 1
+    n = len(tokens)
+    if workers <= 1 or n < 2:
+        return _cyk.cyk(tokens, cnf, structure)
+    tab, apl = _cyk.chart(tokens, structure)
+    for i in range(n):
+        _cyk.fill(tab, apl, cnf, 1, i)
+    pool = Workers(cnf, n, structure, workers)
+    try:
+        row = finished(tab, 1)
+        for length in range(2, n+1):
+            row = pool.fill(tab, apl, cnf, length, row)
+    finally:
+        pool.close()
+    return tab, apl, _cyk.build_mintab(tab, cnf)
+
+def finished(tab, length):
+    cells = []
+    for i in range(len(tab.tokens) - length + 1):
+        cell = tab.cell(length, i)
+        if cell:
+            cells.append((i, cell))
+    return length, cells
+
+class Workers:
+    def __init__(self, cnf, n, structure, count):
+        self.conns = []
+        self.procs = []
+        for _ in range(count):
+            conn, child = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target=work,
+                args=(child, cnf, n, structure), daemon=True)
+            proc.start()
+            child.close()
+            self.conns.append(conn)
+            self.procs.append(proc)
+
+    # fills a length, given the cells of the row finished last.
+    def fill(self, tab, apl, cnf, length, row):
+        cols  = len(tab.tokens) - length + 1
+        count = len(self.conns)
+        data  = pickle.dumps(row, pickle.HIGHEST_PROTOCOL)
+        for w, conn in enumerate(self.conns):
+            conn.send_bytes(data)
+            conn.send((length, cols*w//count, cols*(w+1)//count))
+        cells = []
+        for conn in self.conns:
+            for i, cell, splits in conn.recv():
+                index = tab.index(length, i)
+                tab.cells[index] = cell
+                cells.append((i, cell))
+                if apl is not None:
+                    apl.cells[index] = decode(cnf, splits)
+        return length, cells
+
+    def close(self):
+        for conn in self.conns:
+            conn.send_bytes(pickle.dumps(None))
+            conn.close()
+        for proc in self.procs:
+            proc.join()
+
+def work(conn, cnf, n, structure):
+    tab     = _cyk.Chart([None] * n)
+    numbers = dict((pair, p) for p, pair in enumerate(cnf.pairs))
+    while True:
+        row = pickle.loads(conn.recv_bytes())
+        if row is None:
+            break
+        length, cells = row
+        for i, cell in cells:
+            tab.cells[tab.index(length, i)] = cell
+        length, start, stop = conn.recv()
+        out = []
+        for i in range(start, stop):
+            cell  = {}
+            acell = [] if structure else None
+            _cyk.fill_cell(tab, cnf, length, i, cell, acell)
+            if cell:
+                out.append((i, cell, encode(numbers, acell)))
+        conn.send(out)
+
+# the structure goes back as (pair number, k), the leads follow the pairs.
+def encode(numbers, acell):
+    if acell is None:
+        return None
+    return [(numbers[obj], k) for obj, k in acell if obj in numbers]
+
+def decode(cnf, splits):
+    acell = []
+    for p, k in splits:
+        pair = cnf.pairs[p]
+        acell.append((pair, k))
+        for lead in cnf.leads[pair.var]:
+            acell.append((lead, k))
+    return tuple(acell)
+
+# Parses many independent token lists with one grammar on a process pool.
+# The grammar is handed to each worker once, at start, and compiled there
+# once. Every parse comes back as a Summary instead of a Table.
+def parse_many(grammar, streams, goals, workers=None, chunksize=1, ordered=True, visitor=None, args=()):
+    jobs = ((index, list(tokens)) for index, tokens in enumerate(streams))
+    setup = (grammar, goals, visitor, args)
+    if workers == 1:
+        start(*setup)
+        for job in jobs:
+            yield summarize(job)
+        return
+    with multiprocessing.Pool(workers, start, setup) as pool:
+        if ordered:
+            yield from pool.imap(summarize, jobs, chunksize)
+        else:
+            yield from pool.imap_unordered(summarize, jobs, chunksize)
+
+job = None
+
+def start(grammar, goals, visitor, args):
+    global job
+    grammar.cnf
+    job = (grammar, goals, visitor, args)
+
+def summarize(item):
+    grammar, goals, visitor, args = job
+    index, tokens = item
+    table = grammar.parse(tokens, structure="lazy")
+    goal   = document.reaches(table, goals)
+    output = None
+    # an ambiguous goal covers the input too, only its traversal is left out.
+    if goal is not None:
+        for result in table.just(1):
+            if result[0] in goals and result.ambiguity == 1:
+                goal   = result[0]
+                output = result.traverse(visitor, *args)
+                break
+    return Summary(index, goal, table.shortest, output)
+
+# what parse_many tells about one parse.
+class Summary:
+    def __init__(self, index, goal, shortest, output):
+        self.index    = index    # position of the tokens in the input
+        self.goal     = goal     # the goal symbol that covers the input, or None
+        self.shortest = shortest
+        self.output   = output   # traversal of the goal, if it is unambiguous
+
+    @property
+    def success(self):
+        return self.goal is not None
+
+    def __repr__(self):
+        return "Summary({0.index}, {0.goal!r}, {0.shortest}, {0.output!r})".format(self)
@@ -0,0 +1,118 @@
+# Parsing from asyncio, for serving many clients as they type.
+# The chart is filled in an executor one span length at a time and the
+# coroutine waits on each length, so cancelling it stops the fill at
+# the next length. A newer parse in the same Session supersedes the
+# older one the same way. When the deadline comes first the lengths
+# filled so far are kept: they form a chart like max_span gives, so the
+# shortest cover and the intervals are right for spans up to there.
+#
+# serve() answers parses over a local socket, one json object a line:
+#
+#     {"session": "a", "text": "1 + 2", "deadline": 0.05}
+import asyncio, json
+from . import Table, cyk, intervals, tokenize
+
+# raised in a parse that a newer parse of its session replaced.
+class Superseded(Exception):
+    pass
+
+# the parses of one client, only the latest one runs to the end.
+class Session:
+    def __init__(self):
+        self.latest = 0
+
+    def enter(self):
+        self.latest += 1
+        return self.latest
+
+    def check(self, ticket):
+        if ticket != self.latest:
+            raise Superseded()
+
+# a table filled only up to spans of filled tokens, the deadline came first.
+# It is not complete, so Grammar.reparse() parses it again from the start.
+class Partial(Table):
+    def __init__(self, grammar, tab, apl, mintab, cnf, filled):
+        Table.__init__(self, grammar, tab, apl, mintab, cnf, complete=False)
+        self.filled = filled
+
+# deadline is in seconds from the call, the tokens always get filled.
+async def parse(grammar, tokens, deadline=None, session=None, executor=None, structure="full"):
+    loop   = asyncio.get_running_loop()
+    stop   = None if deadline is None else loop.time() + deadline
+    ticket = None if session is None else session.enter()
+    cnf = await loop.run_in_executor(executor, lambda: grammar.cnf)
+    if session is not None:
+        session.check(ticket)
+    tab, apl = cyk.chart(tokens, structure == "full")
+    n = len(tokens)
+    filled = 0
+    for length in range(1, n+1):
+        if length > 1 and stop is not None and loop.time() >= stop:
+            break
+        await loop.run_in_executor(executor, fill, tab, apl, cnf, length)
+        filled = length
+        if session is not None:
+            session.check(ticket)
+    mintab = await loop.run_in_executor(executor, cyk.build_mintab, tab, cnf)
+    if filled == n:
+        return Table(grammar, tab, apl, mintab, cnf)
+    return Partial(grammar, tab, apl, mintab, cnf, filled)
+
+def fill(tab, apl, cnf, length):
+    for i in range(len(tab.tokens) - length + 1):
+        cyk.fill(tab, apl, cnf, length, i)
+
+# starts the server, run it with: async with server: await server.serve_forever()
+# Every connection may keep several sessions, each answer names its
+# session and tells whether it is "done", "partial" or "superseded".
+async def serve(grammar, host="127.0.0.1", port=0, goals=None, deadline=None, executor=None):
+    keywords = grammar.keywords()
+    async def handle(reader, writer):
+        sessions = {}
+        lock  = asyncio.Lock()
+        tasks = set()
+        async def answer(request):
+            name    = request.get("session")
+            session = sessions.setdefault(name, Session())
+            tokens  = list(tokenize(request.get("text", ""), keywords))
+            reply   = {"session": name, "id": request.get("id")}
+            try:
+                table = await parse(grammar, tokens, request.get("deadline", deadline), session, executor, "lazy")
+            except Superseded:
+                reply["status"] = "superseded"
+            else:
+                reply.update(describe(table, goals))
+            async with lock:
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.ensure_future(answer(json.loads(line)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+    return await asyncio.start_server(handle, host, port)
+
+def describe(table, goals):
+    n = len(table.tab[0])
+    reply = {
+        "status":    "partial" if isinstance(table, Partial) else "done",
+        "tokens":    n,
+        "shortest":  table.shortest,
+        "intervals": sorted(intervals(table))[:16],
+    }
+    if isinstance(table, Partial):
+        reply["filled"] = table.filled
+    if goals is not None and n > 0:
+        symbols = table.cnf.symbols
+        reply["goals"] = sorted(str(symbols[var]) for var in table.tab[n][0] if symbols[var] in goals)
+    return reply